@@ -0,0 +1,35 @@
+from flask import Flask, Response, request, jsonify
+from metrics import render_prometheus, turn_span
+from chatbot import answer_with_context, conversation_history, remember_turn
+
+# Run with gunicorn: `gunicorn api:api` (never imports Streamlit)
+
+# ==============================================
+# Flask API endpoint for FB → Chatbot forwarding
+# ==============================================
+api = Flask(__name__)
+
+@api.route("/endpoint", methods=["POST"])
+def chatbot_endpoint():
+    payload = request.get_json(silent=True) or {}
+    user_message = payload.get("message", "")
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+
+    # Messages from the same sender share one conversation; without an id the reply is stateless.
+    # API ids live in their own namespace, apart from the UI's session ids.
+    sender_id = payload.get("sender_id")
+    conversation_id = f"api:{sender_id}" if sender_id else None
+
+    # Build RAG prompt + get GPT response (or a cached answer to a similar question)
+    with turn_span(conversation_id or "api"):
+        history = conversation_history(conversation_id)
+        reply = answer_with_context(user_message, k=2, history=history)
+        remember_turn(conversation_id, user_message, reply)
+
+    return jsonify({"reply": reply})
+
+@api.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    # Prometheus scrape target: stage latencies, token usage, cache hit rates
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
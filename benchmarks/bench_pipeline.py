@@ -0,0 +1,262 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ==========================================================
+# Offline benchmark for the chat turn pipeline
+# ==========================================================
+# Runs detect_intent -> retrieval -> build_prompt_with_context ->
+# get_completion_from_messages against the local fake OpenAI server and reports
+# p50/p95/p99 per stage, throughput at N concurrent sessions and (optionally)
+# memory per session. Each session is a conversation ("api:bench-<i>") whose
+# history and summary carry over between turns, as in api.py; --stateless
+# drops the ids. Results are saved as JSON and can be compared with an
+# earlier run to catch regressions:
+#
+#   python benchmarks/bench_pipeline.py --sessions 20 --turns 5 --output before.json
+#   python benchmarks/bench_pipeline.py --sessions 20 --turns 5 --compare before.json
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import add_profile_arguments, profile_from_args, start_server  # noqa: E402
+from turn_pipeline import classify_and_retrieve  # noqa: E402
+
+QUESTIONS = [
+    "What is your pricing?",
+    "How much does the chatbot cost per month?",
+    "What does TerraPeak do?",
+    "Can you help us enter the Singapore market?",
+    "What does the AI Ordering Assistant cost?",
+    "Do you offer sales training for SMEs?",
+    "Which industries do you work with?",
+    "Hi, how are you?",
+    "How long does AI setup take?",
+    "What are the optional add-ons for the Growth plan?",
+]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "mean_ms": sum(samples) / len(samples) if samples else None,
+        "p50_ms": percentile(samples, 0.50),
+        "p95_ms": percentile(samples, 0.95),
+        "p99_ms": percentile(samples, 0.99),
+        "max_ms": max(samples) if samples else None,
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds * 1000.0)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+
+def run_turn_staged(app, question, recorder, conversation_id=None):
+    started = time.perf_counter()
+
+    mark = time.perf_counter()
+    intent = app.detect_intent(question)
+    recorder.add("intent", time.perf_counter() - mark)
+    if intent == "handoff":
+        recorder.add("turn", time.perf_counter() - started)
+        return
+
+    mark = time.perf_counter()
+    indices, _ = app.retrieve_relevant_articles(question, k=2)
+    recorder.add("retrieval", time.perf_counter() - mark)
+
+    mark = time.perf_counter()
+    prompt = app.build_prompt_with_context(question, k=2, indices=indices)
+    recorder.add("prompt_build", time.perf_counter() - mark)
+
+    mark = time.perf_counter()
+    history = app.conversation_history(conversation_id)
+    recorder.add("history", time.perf_counter() - mark)
+
+    mark = time.perf_counter()
+    answer = app.get_completion_from_messages([{"role": "user", "content": prompt}], history=history)
+    recorder.add("completion", time.perf_counter() - mark)
+    if answer in app.COMPLETION_ERROR_MESSAGES:
+        recorder.error()
+    app.remember_turn(conversation_id, question, answer)
+
+    recorder.add("turn", time.perf_counter() - started)
+
+
+def run_turn_concurrent(app, question, recorder, conversation_id=None):
+    # Same path as the chat UI and API: intent and retrieval side by side, then
+    # the answer with this session's history, which is then updated
+    started = time.perf_counter()
+
+    mark = time.perf_counter()
+    intent, retrieved = classify_and_retrieve(
+        question, app.detect_intent, lambda query: app.retrieve_relevant_articles(query, k=2)
+    )
+    recorder.add("intent_and_retrieval", time.perf_counter() - mark)
+
+    if intent != "handoff":
+        mark = time.perf_counter()
+        history = app.conversation_history(conversation_id)
+        recorder.add("history", time.perf_counter() - mark)
+
+        mark = time.perf_counter()
+        answer = app.answer_with_context(question, k=2, retrieved=retrieved, history=history, intent=intent)
+        recorder.add("answer", time.perf_counter() - mark)
+        if answer in app.COMPLETION_ERROR_MESSAGES:
+            recorder.error()
+        app.remember_turn(conversation_id, question, answer)
+
+    recorder.add("turn", time.perf_counter() - started)
+
+
+def run_session(app, session_id, args, recorder):
+    run_turn = run_turn_concurrent if args.pipeline == "concurrent" else run_turn_staged
+    # Each session is its own conversation, namespaced like api.py's senders
+    conversation_id = None if args.stateless else f"api:bench-{session_id}"
+    for turn in range(args.turns):
+        question = QUESTIONS[(session_id + turn) % len(QUESTIONS)]
+        if args.unique_queries:
+            question = f"{question} (session {session_id}, turn {turn})"
+        try:
+            run_turn(app, question, recorder, conversation_id)
+        except Exception as e:
+            print(f"[Benchmark] Turn failed: {e}", file=sys.stderr)
+            recorder.error()
+
+
+def compare(results, baseline, max_regression):
+    """
+    Print per-stage p50/p95 changes against a baseline; return True if any stage
+    regressed by more than max_regression (a fraction, e.g. 0.2 = 20%).
+    """
+    regressed = False
+    for stage, summary in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            before, after = previous.get(key), summary.get(key)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            flag = ""
+            if change > max_regression:
+                flag = "  <-- regression"
+                regressed = True
+            print(f"{stage:>22} {key}: {before:9.1f} -> {after:9.1f} ms ({change:+.0%}){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chat turn pipeline offline.")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--pipeline", choices=["staged", "concurrent"], default="staged",
+                        help="staged: time each stage in sequence; concurrent: the chat UI's turn path")
+    parser.add_argument("--unique-queries", action="store_true", help="make every question unique (cold caches)")
+    parser.add_argument("--memory", action="store_true", help="measure memory per session with tracemalloc")
+    parser.add_argument("--stateless", action="store_true",
+                        help="no conversation ids (every turn stateless, as before sessions had memory)")
+    parser.add_argument("--output", default=os.path.join(REPO_ROOT, "benchmarks", "results.json"))
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_server(profile_from_args(args))
+    workdir = tempfile.mkdtemp(prefix="terrapeak-bench-")
+    os.environ.update({
+        "OPENAI_API_KEY": "fake-key",
+        "OPENAI_BASE_URL": base_url,
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embeddings"),
+        "LOG_DB_PATH": os.path.join(workdir, "interactions.db"),
+    })
+
+    # Import after the environment points at the fake server (this builds the index);
+    # the chatbot core runs without Streamlit
+    import chatbot as app
+
+    # Warm-up turn so one-time setup (intent centroids, tokenizer) isn't measured
+    run_turn_staged(app, "Hello", Recorder())
+
+    if args.memory:
+        tracemalloc.start()
+        baseline_memory = tracemalloc.get_traced_memory()[0]
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        for future in [executor.submit(run_session, app, i, args, recorder) for i in range(args.sessions)]:
+            future.result()
+    wall_time = time.perf_counter() - started
+
+    memory_per_session = None
+    if args.memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory_per_session = {
+            "retained_kb": (current - baseline_memory) / 1024 / args.sessions,
+            "peak_kb": (peak - baseline_memory) / 1024 / args.sessions,
+        }
+
+    turns = len(recorder.samples.get("turn", []))
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "wall_time_s": wall_time,
+        "turns": turns,
+        "throughput_turns_per_s": turns / wall_time if wall_time else None,
+        "errors": recorder.errors,
+        "memory_per_session": memory_per_session,
+        "stages": {stage: summarize(samples) for stage, samples in recorder.samples.items()},
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2)
+
+    print(f"{turns} turns in {wall_time:.2f}s ({results['throughput_turns_per_s']:.1f} turns/s), {recorder.errors} errors")
+    for stage, summary in results["stages"].items():
+        print(f"{stage:>22}: p50 {summary['p50_ms']:8.1f}  p95 {summary['p95_ms']:8.1f}  p99 {summary['p99_ms']:8.1f} ms")
+    if memory_per_session:
+        print(f"memory per session: {memory_per_session['retained_kb']:.1f} KB retained, "
+              f"{memory_per_session['peak_kb']:.1f} KB peak")
+    print(f"Results written to {args.output}")
+
+    server.shutdown()
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as handle:
+            if compare(results, json.load(handle), args.max_regression):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+
+# ==========================================================
+# Regression checks for the concurrency and failure handling
+# ==========================================================
+# Runs offline against the fake OpenAI server and exits non-zero if a check fails:
+#   - a failing single-flight leader releases its followers (also in the
+#     streaming answer path, where prompt build/routing can raise)
+#   - circuit breaker: opens after N failures, lets one half-open trial through,
+#     closes again on success
+#   - an upstream that only returns 500s fails fast, and fails instantly once
+#     the breakers are open
+#   - rows whose Sheets write failed are released for the next flush, and numeric
+#     fields replay as numbers
+#
+#   python benchmarks/check_resilience.py
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import Profile, start_server  # noqa: E402
+
+
+def check_single_flight_leader_failure(app):
+    from single_flight import SingleFlight
+
+    group = SingleFlight("check", timeout=5)
+    started, results = threading.Event(), []
+
+    def leader():
+        def fail():
+            started.set()
+            time.sleep(0.2)
+            raise RuntimeError("upstream failed")
+        try:
+            group.do("key", fail)
+        except RuntimeError as e:
+            results.append(("leader", str(e)))
+
+    def follower():
+        started.wait()
+        try:
+            group.do("key", lambda: "should not run")
+        except RuntimeError as e:
+            results.append(("follower", str(e)))
+
+    threads = [threading.Thread(target=leader), threading.Thread(target=follower)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert sorted(results) == [("follower", "upstream failed"), ("leader", "upstream failed")], results
+    assert group.in_flight() == 0
+
+    # Streaming answers: a failure before the stream starts must not leave the key in flight
+    route_answer = app._route_answer
+
+    def broken_route(*args, **kwargs):
+        raise RuntimeError("routing failed")
+
+    app._route_answer = broken_route
+    try:
+        list(app.stream_answer_with_context("Which markets do you cover? (flight check)"))
+        raise AssertionError("stream_answer_with_context did not raise")
+    except RuntimeError:
+        pass
+    finally:
+        app._route_answer = route_answer
+    assert app.answer_flight.in_flight() == 0, "streaming flight left in flight"
+
+
+def check_circuit_breaker():
+    from resilience import CircuitBreaker
+
+    breaker = CircuitBreaker("check", failure_threshold=2, reset_timeout=0.2)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open and not breaker.allow(), "breaker should open after 2 failures"
+
+    time.sleep(0.25)
+    assert breaker.allow(), "half-open breaker should let one trial through"
+    assert not breaker.allow(), "only one trial call at a time"
+    breaker.record_failure()
+    assert breaker.is_open and not breaker.allow(), "failed trial should reopen the breaker"
+
+    time.sleep(0.25)
+    assert breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open and breaker.allow(), "successful trial should close the breaker"
+
+
+def check_server_errors_fail_fast(app, profile):
+    profile.error_rate = 1.0
+    try:
+        started = time.monotonic()
+        answer = app.get_completion_from_messages([{"role": "user", "content": "Hello (500 check)"}])
+        first = time.monotonic() - started
+        assert answer == app.OPENAI_ERROR_MESSAGE, answer
+        assert first < 5.0, f"500-only upstream took {first:.1f}s"
+
+        started = time.monotonic()
+        answer = app.get_completion_from_messages([{"role": "user", "content": "Hello again (500 check)"}])
+        second = time.monotonic() - started
+        assert answer == app.OPENAI_ERROR_MESSAGE, answer
+        assert second < 0.5, f"open breakers should fail instantly, took {second:.2f}s"
+    finally:
+        profile.error_rate = 0.0
+
+
+def check_sheets_lease_release():
+    from log_backend import InteractionLog
+    from sheets_logger import SheetsLogWriter
+
+    store = InteractionLog(os.path.join(tempfile.mkdtemp(prefix="terrapeak-check-"), "interactions.db"))
+    store.append({"name": "Check", "message_number": 3, "session_id": "check"})
+    writer = SheetsLogWriter(store, batch_size=100, flush_interval=3600, max_retries=0)
+
+    def unavailable():
+        raise RuntimeError("Sheets unavailable")
+
+    class Worksheet:
+        rows = []
+
+        def append_rows(self, rows, value_input_option=None):
+            self.rows.extend(rows)
+
+    writer._get_worksheet = unavailable
+    writer._flush()
+    claimed = store.claim_pending(10)
+    assert len(claimed) == 1, "rows of a failed write should be claimable again"
+    store.release([row_id for row_id, _ in claimed])
+
+    worksheet = Worksheet()
+    writer._get_worksheet = lambda: worksheet
+    writer._flush()
+    assert len(worksheet.rows) == 1 and worksheet.rows[0][10] == 3, worksheet.rows
+    assert store.claim_pending(10) == [], "written rows should be marked synced"
+    writer.close()
+
+
+def main():
+    profile = Profile(latency_ms=5, jitter_ms=0, token_delay_ms=0, stream_chunks=5)
+    server, base_url = start_server(profile)
+    workdir = tempfile.mkdtemp(prefix="terrapeak-check-")
+    os.environ.update({
+        "OPENAI_API_KEY": "fake-key",
+        "OPENAI_BASE_URL": base_url,
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embeddings"),
+        "LOG_DB_PATH": os.path.join(workdir, "interactions.db"),
+        "OPENAI_RETRY_BASE_DELAY": "0.01",
+        "CIRCUIT_FAILURE_THRESHOLD": "3",
+    })
+
+    # Import after the environment points at the fake server (this builds the index)
+    import chatbot as app
+
+    checks = [
+        ("single flight leader failure", lambda: check_single_flight_leader_failure(app)),
+        ("circuit breaker", check_circuit_breaker),
+        ("500-only upstream fails fast", lambda: check_server_errors_fail_fast(app, profile)),
+        ("sheets lease release", check_sheets_lease_release),
+    ]
+    failed = 0
+    for name, check in checks:
+        try:
+            check()
+            print(f"ok    {name}")
+        except Exception as e:
+            failed += 1
+            print(f"FAIL  {name}: {type(e).__name__}: {e}")
+
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
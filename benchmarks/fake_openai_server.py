@@ -0,0 +1,218 @@
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+# ==========================================================
+# Local OpenAI-compatible stand-in for offline benchmarks
+# ==========================================================
+# Serves /v1/embeddings and /v1/chat/completions (streaming and non-streaming)
+# with configurable latency, error and rate-limit profiles. Embeddings are
+# deterministic per text, so caches behave as they would against the real API.
+#
+#   python benchmarks/fake_openai_server.py --port 8900 --latency-ms 300
+#   OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=fake streamlit run main.py
+
+
+class Profile:
+    """
+    Latency and failure behaviour of the fake server.
+    """
+
+    def __init__(self, latency_ms=200.0, jitter_ms=50.0, embedding_latency_ms=None,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0,
+                 token_delay_ms=5.0, stream_chunks=40, dim=1536, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.embedding_latency_ms = latency_ms / 2 if embedding_latency_ms is None else embedding_latency_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.token_delay_ms = token_delay_ms
+        self.stream_chunks = stream_chunks
+        self.dim = dim
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay(self, base_ms):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, base_ms + jitter) / 1000.0)
+
+    def failure(self):
+        """
+        Return None, or (status, body, headers) for a simulated failure.
+        """
+        with self.lock:
+            roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return 429, {"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}}, \
+                {"Retry-After": str(self.retry_after)}
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500, {"error": {"message": "Internal server error (fake)", "type": "server_error"}}, {}
+        return None
+
+
+def fake_embedding(text, dim):
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).round(6).tolist()
+
+
+def fake_answer(messages, chunks):
+    question = messages[-1].get("content", "") if messages else ""
+    words = [f"word{i}" for i in range(chunks)]
+    return f"(fake answer to {len(question)} chars) " + " ".join(words)
+
+
+def make_handler(profile):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+            failure = profile.failure()
+            if failure:
+                status, error, headers = failure
+                self._send_json(status, error, headers)
+                return
+
+            if self.path.endswith("/embeddings"):
+                self._embeddings(body)
+            elif self.path.endswith("/chat/completions"):
+                self._chat(body)
+            else:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        def _embeddings(self, body):
+            inputs = body.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            profile.delay(profile.embedding_latency_ms)
+            tokens = sum(len(text) // 4 + 1 for text in inputs)
+            self._send_json(200, {
+                "object": "list",
+                "model": body.get("model", ""),
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": fake_embedding(text, profile.dim)}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+
+        def _chat(self, body):
+            messages = body.get("messages", [])
+            prompt_tokens = sum(len(m.get("content") or "") // 4 + 4 for m in messages)
+            answer = fake_answer(messages, profile.stream_chunks)
+            completion_tokens = profile.stream_chunks + 6
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0},
+            }
+            base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "")}
+
+            # Time to first token
+            profile.delay(profile.latency_ms)
+
+            if not body.get("stream"):
+                time.sleep(profile.token_delay_ms * profile.stream_chunks / 1000.0)
+                self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[
+                    {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": answer}}
+                ]))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            for word in answer.split(" "):
+                chunk = dict(base, object="chat.completion.chunk", choices=[
+                    {"index": 0, "delta": {"content": word + " "}, "finish_reason": None}
+                ])
+                self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+                self.wfile.flush()
+                time.sleep(profile.token_delay_ms / 1000.0)
+            final = dict(base, object="chat.completion.chunk", usage=usage, choices=[
+                {"index": 0, "delta": {}, "finish_reason": "stop"}
+            ])
+            self.wfile.write(b"data: " + json.dumps(final).encode("utf-8") + b"\n\n")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_server(profile, host="127.0.0.1", port=0):
+    """
+    Start the fake server in a daemon thread; returns (server, base_url).
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(profile))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def add_profile_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="chat time-to-first-token")
+    parser.add_argument("--embedding-latency-ms", type=float, default=None, help="defaults to half of --latency-ms")
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--token-delay-ms", type=float, default=5.0, help="delay between streamed chunks")
+    parser.add_argument("--stream-chunks", type=int, default=40, help="answer length in words")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered with HTTP 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429")
+    parser.add_argument("--dim", type=int, default=1536, help="embedding dimension")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def profile_from_args(args):
+    return Profile(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        embedding_latency_ms=args.embedding_latency_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        token_delay_ms=args.token_delay_ms,
+        stream_chunks=args.stream_chunks,
+        dim=args.dim,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_server(profile_from_args(args), args.host, args.port)
+    print(f"Fake OpenAI API listening on {base_url}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,673 @@
+import os
+import json
+import hashlib
+import httpx
+import openai
+import logging
+import time
+from dotenv import load_dotenv, find_dotenv
+from openai import OpenAIError, RateLimitError
+from embedding_store import EmbeddingStore
+from openai_client import get_openai_client
+from embeddings import EMBEDDING_MODEL, get_embeddings, get_query_embedding, normalize_query
+from metrics import inc, record_stage, record_usage, timed
+from prompt_budget import CONTEXT_TOKEN_BUDGET, assemble_messages, count_tokens, select_within_budget
+from chunking import merge_passages, passage_embedding_text, split_articles
+from retrieval import RetrievalEngine, corpus_fingerprint, get_retrieval_engine
+from response_cache import response_cache
+from single_flight import SingleFlight
+from resilience import call_openai, call_with_fallback, fallback_models
+from model_router import get_model_router
+from conversation_store import conversation_store
+from conversation_summary import build_summary_messages, get_conversation_summarizer
+from log_backend import get_interaction_log
+from sheets_logger import get_sheets_writer
+from intent import INTENTS, INTENT_EXAMPLES, IntentClassifier, get_intent_classifier, match_live_chat_trigger
+from static_assets import SYSTEM_PROMPT
+
+# ==========================================================
+# Chatbot core: articles, retrieval, intent, answers, memory
+# ==========================================================
+# Shared by the Streamlit UI (main.py) and the Flask API (api.py). Imported once
+# per process, so the index build and everything defined here is not repeated
+# on Streamlit reruns. Must not import Streamlit.
+
+# =============================
+# Load environment variables
+# ============================
+_ = load_dotenv(find_dotenv())
+
+# ===================
+# OpenAI API Key
+# ===================
+openai.api_key = os.getenv("OPENAI_API_KEY")
+
+# ===========================
+# For debugging purposes
+# ===========================
+print("OPENAI_API_KEY:", os.getenv("OPENAI_API_KEY"))
+
+# ================================
+# Logging Function to Google Sheet
+# ================================
+def log_to_google_sheets(data):
+    """
+    Record the interaction in the local log (log_backend.py) and wake the
+    background Sheets writer, which replays it to the sheet in a batch.
+    """
+    try:
+        with timed("local_log"):
+            get_interaction_log().append(data)
+        get_sheets_writer().notify()
+        return True
+
+    except Exception as e:
+        print(f"[Google Sheets Logging Error] {e}")
+        return False
+
+
+# ====================================================
+# STEP 1: Define and Store Your Articles (RAG Source)
+# ====================================================
+articles = [
+    {
+        "title": "TerraPeak Official Launch",
+        "content": """March 5, 2025 – Singapore        
+TerraPeak Consulting officially launches, offering expert-led market expansion, sales growth strategies, and practical AI integration to global businesses. Specializing in APAC market entry and growth support for Asian SMEs and family businesses, TerraPeak aims to redefine strategic growth.
+Founded by experienced market and sales strategists, TerraPeak combines exploration with sustainable, strategic growth. With proven expertise, TerraPeak guides companies in harnessing AI to improve sales and operational efficiency.
+Core Offerings:
+- Expert Market Expansion into APAC
+- Revenue-Driven Sales Growth
+- Seamless AI Integration
+- Family Business Growth & Transformation
+Committed to responsible, ethical, and sustainable growth, TerraPeak offers tailored solutions ensuring long-term success and resilience. Businesses seeking expansion, transformation, and innovation are encouraged to reach out via connect@terrapeakgroup.com."""
+    },
+    {
+        "title": "Unlocking Opportunities: A Guide to Doing Business in Asia",
+        "content": """Asia’s markets are diverse, each with distinct cultures, regulations, and consumer preferences. Successful market entry requires careful planning and cultural understanding.
+1. Recognize Diversity: Each Asian market differs significantly. Independent research on consumer preferences, economic conditions, and regulatory landscapes is crucial.
+2. Understand Cultural Nuances: Personal relationships and trust-building are essential. Face-to-face interactions and awareness of local business etiquette enhance partnership opportunities.
+3. Navigate Regulations: Legal frameworks vary widely. Consulting local legal experts helps ensure compliance and protection, particularly for intellectual property rights.
+4. Adapt Products and Services: Localization involves more than translation; products, pricing strategies, and marketing channels should align with local tastes and usage patterns.
+5. Leverage Local Partnerships: Strategic partnerships offer invaluable market insights, reduce entry costs, and minimize risks associated with unfamiliar markets.
+6. Invest in Talent and Training: Hiring skilled local talent and providing basic cross-cultural training ensures smooth operations and effective market penetration.
+7. Stay Agile and Innovative: Regularly reassessing market trends and technological advancements allows businesses to remain competitive and responsive in dynamic Asian markets."""
+    },
+    {
+        "title": "AI & SMEs: 10 Key Stats Revealing Growth, Challenges, and Opportunities",
+        "content": """Artificial Intelligence (AI) is rapidly changing how SMEs and family businesses operate, offering significant productivity gains, enhanced customer engagement, and cost efficiencies. Adoption among SMEs is growing quickly, with many businesses already using AI-powered solutions like chatbots, social media automation, and generative AI.
+SMEs widely recognize AI’s benefits, including improved efficiency, automated marketing, sales forecasting, and better customer service. However, common concerns include knowledge gaps, high initial costs, uncertainty about return on investment (ROI), cybersecurity, and data privacy.
+Practical, user-friendly AI solutions designed specifically for SMEs are making adoption easier. Cloud-based AI services (AI-as-a-Service) and generative AI tools have increased accessibility, allowing SMEs to automate processes, create engaging content, and enhance productivity without large upfront investments.
+To fully leverage AI’s potential, SMEs should:
+- Develop clear AI adoption strategies and roadmaps.
+- Establish measurable KPIs to track AI effectiveness.
+- Use cost-effective AI tools tailored to their specific business needs.
+SMEs strategically adopting AI gain a competitive edge, achieve sustainable growth, and drive long-term efficiency."""
+    },
+    {
+        "title": "SGD Digital Solutions Brochure",
+        "content": """At TerraPeak Group, automation is about working smarter, not harder. Our digital solutions empower businesses to embrace AI and automation without complexity. We offer:
+• AI Chatbots – Automate customer inquiries 24/7, improve lead generation, and boost customer service. Designed for SMEs and family businesses, our bots are platform-native, multilingual, and customizable (p.5-6).
+• Facebook & WhatsApp Bots – Handle FAQs, schedule appointments, track orders, and sync with Google Sheets or CRMs. Includes GDPR compliance, smart triggers, and analytics (p.6-7).
+• AI Social Media Automation – Auto-schedule content, generate captions, and track interactions. Our system improves engagement, visibility, and saves time (p.8-9).
+• AI Task Manager – Automate task assignments and team workflows. Keeps SMEs productive and aligned without admin overload (p.10).
+• AI Ordering Assistant – Smart (re)ordering engine that analyzes past sales to suggest stock quantities, highlight profit-makers, and avoid over/under-stocking (p.11-12).
+• Pricing Plans (Chatbot) – Starter, Growth, and Pro tiers ranging from 500 to unlimited interactions, with add-ons like CRM, training calls, and channel integrations (p.13-15).
+• AI Tool Pricing – Each tool is priced separately (e.g. S$1000 setup + S$250 monthly for the Ordering Assistant) with standalone options available (p.16).
+Contact: connect@terrapeakgroup.com | www.terrapeakgroup.com | +65 8061 9479 (p.17)"""
+    },
+    {
+        "title": "TerraPeak Pricing Plans",
+        "content": """TerraPeak offers transparent, scalable pricing for automation and AI services.
+
+CHATBOT PLANS
+
+Starter
+- One-time setup: S$750–1500
+- Monthly: S$100
+- 500 interactions/month
+- Best for: Micro-businesses or first-time chatbot users
+
+Growth (Recommended)
+- One-time setup: S$750–1500
+- Monthly: S$200
+- 2000 interactions/month
+- Best for: SMEs scaling up with light integration needs
+
+Pro
+- One-time setup: S$1500–3500
+- Monthly: S$400
+- Unlimited interactions
+- Best for: Companies needing full automation and CRM support
+
+OPTIONAL ADD-ONS (Starter and Growth)
+- Facebook / WhatsApp channel: S$75 per month per channel
+- Extra 1000 interactions: S$50 per month
+- One-time training or support call: S$100 per call
+- CRM Integration: Custom quote
+
+AI TOOL PRICING
+
+Article Generation
+- S$5 per article
+
+AI Task Manager
+- S$1000 setup
+- S$20 per user per month
+
+AI Ordering Assistant
+- S$1500 setup
+- S$250 per month
+
+All services include a 30-day money-back guarantee if not satisfied."""
+    }
+]
+
+
+# ============================================================
+# STEP 2: Embedding Functions
+# ============================================================
+# get_query_embedding (cached, per user query) and get_embeddings (batched corpus)
+# live in embeddings.py so the retrieval engine and API can use them without the UI.
+
+# ===================================================================
+# STEP 3: Split Articles into Passages, Embed Them and Build FAISS Index
+# ===================================================================
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".embedding_cache")
+
+# Articles are indexed as overlapping, token-bounded passages (see chunking.py)
+indexed_passages = split_articles(
+    articles,
+    max_tokens=int(os.getenv("PASSAGE_MAX_TOKENS", "300")),
+    overlap_tokens=int(os.getenv("PASSAGE_OVERLAP_TOKENS", "50")),
+    count_tokens=count_tokens
+)
+
+def build_retrieval_engine():
+    """
+    Embed the article passages (reusing the on-disk cache so only new or edited
+    passages, or a changed embedding model, hit the API) and index them with FAISS.
+    """
+    embedding_store = EmbeddingStore(EMBEDDING_CACHE_DIR, model=EMBEDDING_MODEL)
+    passage_embeddings = embedding_store.embed_corpus(
+        [passage_embedding_text(passage) for passage in indexed_passages],
+        lambda texts: get_embeddings(texts, model=EMBEDDING_MODEL)
+    )
+    return RetrievalEngine(
+        indexed_passages,
+        passage_embeddings,
+        lambda query: get_query_embedding(query, model=EMBEDDING_MODEL),
+        backend=os.getenv("VECTOR_INDEX_BACKEND", "auto"),
+        index_dir=EMBEDDING_CACHE_DIR,
+        index_key=EMBEDDING_MODEL
+    )
+
+# Built once per process and shared by every Streamlit session and the Flask API;
+# rebuilt only if the articles above are edited
+retrieval_engine = get_retrieval_engine(
+    build_retrieval_engine,
+    fingerprint=corpus_fingerprint(indexed_passages)
+)
+
+# ====================================================================
+# STEP 4: Create a Function to Retrieve Relevant Articles for a Query
+# ====================================================================
+def retrieve_relevant_articles(query, k=2):
+    """
+    Retrieve the indices and distances of the k most relevant article passages for the given query.
+    Includes error handling to avoid crashes on embedding or index issues.
+    """
+    try:
+        # Embed the query and search the shared FAISS index for the top-k similar passages
+        with timed("retrieval"):
+            return retrieval_engine.search(query, k)
+
+    except Exception as e:
+        # Embedding failures (after retries, or with the breaker open) already fall
+        # back to keyword search inside the engine; this is for anything else
+        print(f"[Error] Failed to retrieve relevant articles: {e}")
+        inc("retrieval_errors_total", help_text="Retrievals that failed and returned no passages")
+        return [], []
+
+# ============================================================
+# STEP 5: Build a Prompt that Integrates the Retrieved Context
+# ============================================================
+def build_prompt_with_context(user_query, k=None, indices=None):
+    """
+    Build a prompt that includes relevant article context based on the user query.
+    Dynamically expands context if certain keywords like 'pricing' are detected.
+    Pass `indices` to reuse passages that were already retrieved for this query.
+    """
+    # Automatically expand context depth if pricing is mentioned
+    lowered = user_query.lower()
+    if k is None:
+        if "pricing" in lowered or "price" in lowered or "cost" in lowered:
+            k = 5  # Increase context range
+        else:
+            k = 2  # Default to 2 for general queries
+
+    if indices is None:
+        indices, _ = retrieve_relevant_articles(user_query, k)
+
+    with timed("prompt_build"):
+        return _assemble_rag_prompt(user_query, indices)
+
+def _assemble_rag_prompt(user_query, indices):
+    # Neighbouring passages from the same article are merged into one excerpt
+    excerpts = merge_passages([retrieval_engine.documents[i] for i in indices], articles)
+
+    labeled_contexts = []
+    for excerpt in excerpts:
+        labeled_context = f"Source: {excerpt['title']}\n{excerpt['content']}"
+        labeled_contexts.append(labeled_context)
+
+    # Excerpts are ranked best-first; keep as many as the context budget allows
+    labeled_contexts = select_within_budget(labeled_contexts, CONTEXT_TOKEN_BUDGET)
+    full_context = "\n\n".join(labeled_contexts)
+
+    prompt = (
+        f"You are an AI assistant responding to the user's question using the most relevant context below.\n"
+        f"Use the sources to support your answer clearly.\n\n"
+        f"{full_context}\n\n"
+        f"User Question: {user_query}\n\n"
+        f"Answer:"
+    )
+
+    return prompt
+
+# System prompt shared by every conversation (UI sessions and API senders)
+SYSTEM_MESSAGES = [{"role": "system", "content": SYSTEM_PROMPT}]
+
+LIVE_CHAT_KEYWORDS = [
+    "speak", "talk", "call", "consultant", "real person", "human", "live chat", "contact someone"
+]
+
+def detect_intent_with_llm(user_input: str) -> str:
+    system_msg = (
+        "You are an assistant that classifies the intent of a user's message. "
+        "Return only one of the following: 'handoff', 'general', or 'other'. "
+        "Only return 'handoff' if the user clearly asks to talk to a person, speak to a consultant, or requests a meeting."
+    )
+
+    prompt = f"""
+Message: "{user_input}"
+
+What is the user's intent? 
+Return just one word: handoff, general, or other.
+"""
+
+    try:
+        # Same cached prefix as the chat calls (SYSTEM_MESSAGES); only the
+        # classification instructions and the message vary
+        response = get_completion_from_messages([
+            {"role": "system", "content": system_msg},
+            {"role": "user", "content": prompt}
+        ], model=get_model_router(CHAT_MODEL).fast_model, max_tokens=5)
+        result = response.strip().lower()
+        if result not in INTENTS:
+            return "general"
+        return result
+
+    except Exception:
+        # STRICT keyword fallback only when no GPT available
+        # Only trigger handoff if it's clearly asking for help
+        if match_live_chat_trigger(user_input):
+            return "handoff"
+
+        return "general"
+
+
+def build_intent_classifier():
+    """
+    Build the local intent classifier from the example phrases in intent.py.
+    Example embeddings are cached on disk like the article embeddings.
+    """
+    intent_store = EmbeddingStore(os.path.join(EMBEDDING_CACHE_DIR, "intent"), model=EMBEDDING_MODEL)
+    return IntentClassifier.from_examples(
+        INTENT_EXAMPLES,
+        lambda texts: intent_store.embed_corpus(
+            texts, lambda missing: get_embeddings(missing, model=EMBEDDING_MODEL)
+        ),
+        lambda text: get_query_embedding(text, model=EMBEDDING_MODEL),
+        min_margin=float(os.getenv("INTENT_MIN_MARGIN", "0.04"))
+    )
+
+
+def detect_intent(user_input: str) -> str:
+    """
+    Classify intent in-process (keyword rules, then embedding nearest centroid).
+    The LLM is only consulted when the local classifier is unsure or unavailable.
+    """
+    with timed("intent"):
+        try:
+            classifier = get_intent_classifier(build_intent_classifier)
+            result = classifier.classify(user_input, llm_classify=detect_intent_with_llm)
+            label, source = result.label, result.source
+        except Exception as e:
+            print(f"[Intent] Local classifier unavailable, using GPT: {e}")
+            label, source = detect_intent_with_llm(user_input), "llm"
+
+    inc("intent_classifications_total", labels={"intent": label, "source": source},
+        help_text="Intent classifications by result and classifier")
+    return label
+
+
+
+# ==============================================
+# OpenAI Communication Function (uses Chat API)
+# ==============================================
+CHAT_MODEL = "gpt-3.5-turbo-0125"
+STREAM_READ_TIMEOUT = 15  # seconds between streamed chunks
+
+API_KEY_MISSING_MESSAGE = "API key is missing. Please check your environment settings."
+RATE_LIMIT_MESSAGE = "We're handling a high volume of requests right now. Please try again in a moment."
+OPENAI_ERROR_MESSAGE = "Hmm, something went wrong while reaching our assistant. Please try again shortly."
+UNEXPECTED_ERROR_MESSAGE = "Oops, an unexpected error occurred. Please try again or contact support."
+COMPLETION_ERROR_MESSAGES = (
+    API_KEY_MISSING_MESSAGE, RATE_LIMIT_MESSAGE, OPENAI_ERROR_MESSAGE, UNEXPECTED_ERROR_MESSAGE
+)
+
+def _completion_messages(user_messages, max_history, history=None):
+    # Layout is most-static first so OpenAI's automatic prompt caching can reuse the prefix:
+    #   1. SYSTEM_MESSAGES  - byte-identical for every call (chat, intent fallback, API)
+    #   2. conversation summary, then the last few turns that fit the token budget
+    #   3. the current request (RAG prompt or classification question)
+    # Never put per-call values (names, dates, ids) in SYSTEM_MESSAGES.
+    history = history or []
+    summary = [m for m in history if m["role"] == "system"]
+    recent_history = [m for m in history if m["role"] != "system"][-max_history:]
+    return assemble_messages(SYSTEM_MESSAGES + summary, recent_history, user_messages)
+
+def get_completion_from_messages(user_messages, model=CHAT_MODEL, temperature=0, max_history=6, history=None,
+                                 max_tokens=None):
+    """
+    Return the assistant reply; `history` is the earlier conversation (see conversation_store).
+    """
+    try:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            return API_KEY_MISSING_MESSAGE
+
+        client = get_openai_client()
+        messages = _completion_messages(user_messages, max_history, history)
+
+        def create(model_name, timeout):
+            with timed("completion"):
+                return client.chat.completions.create(
+                    model=model_name,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=openai.NOT_GIVEN if max_tokens is None else max_tokens,
+                    timeout=timeout
+                )
+
+        # Retries, circuit breaker and fallback models (see resilience.py);
+        # each attempt times out after 15 seconds to avoid long hangs
+        started = time.perf_counter()
+        response, used_model = call_with_fallback("chat", fallback_models(model), create, timeout=15)
+        record_usage(response.usage, used_model)
+        get_model_router(CHAT_MODEL).record(used_model, time.perf_counter() - started, response.usage)
+
+        return response.choices[0].message.content
+
+    except RateLimitError:
+        logging.warning("Rate limit reached. Try again shortly.")
+        inc("openai_errors_total", labels={"kind": "rate_limit"}, help_text="Failed OpenAI chat calls")
+        return RATE_LIMIT_MESSAGE
+
+    except OpenAIError as e:
+        logging.error(f"OpenAI API error: {e}")
+        inc("openai_errors_total", labels={"kind": "openai"}, help_text="Failed OpenAI chat calls")
+        return OPENAI_ERROR_MESSAGE
+
+    except Exception as e:
+        logging.exception("Unexpected error occurred.")
+        inc("openai_errors_total", labels={"kind": "unexpected"}, help_text="Failed OpenAI chat calls")
+        return UNEXPECTED_ERROR_MESSAGE
+
+def stream_completion_from_messages(user_messages, model=CHAT_MODEL, temperature=0, max_history=6, history=None):
+    """
+    Streaming variant of get_completion_from_messages: yields text deltas as they arrive.
+    Failures yield the same friendly error messages (after any text already sent).
+    """
+    streamed_any = False
+    try:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            yield API_KEY_MISSING_MESSAGE
+            return
+
+        client = get_openai_client()
+        messages = _completion_messages(user_messages, max_history, history)
+
+        started = time.perf_counter()
+
+        def create(model_name, timeout):
+            return client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True},  # usage arrives in the final chunk
+                # The deadline only bounds connecting; each read gets the full
+                # STREAM_READ_TIMEOUT even on a retry, so gaps between tokens don't abort
+                timeout=httpx.Timeout(STREAM_READ_TIMEOUT, connect=timeout)
+            )
+
+        # Retries and fallback models apply until the stream has started
+        stream, used_model = call_with_fallback("chat", fallback_models(model), create, timeout=15)
+
+        usage = None
+        for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+                record_usage(chunk.usage, used_model)
+            if chunk.choices and chunk.choices[0].delta.content:
+                if not streamed_any:
+                    record_stage("completion_first_token", time.perf_counter() - started)
+                streamed_any = True
+                yield chunk.choices[0].delta.content
+
+        record_stage("completion", time.perf_counter() - started)
+        get_model_router(CHAT_MODEL).record(used_model, time.perf_counter() - started, usage)
+
+    except RateLimitError:
+        logging.warning("Rate limit reached. Try again shortly.")
+        inc("openai_errors_total", labels={"kind": "rate_limit"}, help_text="Failed OpenAI chat calls")
+        yield ("\n\n" if streamed_any else "") + RATE_LIMIT_MESSAGE
+
+    except OpenAIError as e:
+        logging.error(f"OpenAI API error: {e}")
+        inc("openai_errors_total", labels={"kind": "openai"}, help_text="Failed OpenAI chat calls")
+        yield ("\n\n" if streamed_any else "") + OPENAI_ERROR_MESSAGE
+
+    except Exception as e:
+        logging.exception("Unexpected error occurred.")
+        inc("openai_errors_total", labels={"kind": "unexpected"}, help_text="Failed OpenAI chat calls")
+        yield ("\n\n" if streamed_any else "") + UNEXPECTED_ERROR_MESSAGE
+
+# ==================================================
+# RAG Answer with Semantic Response Cache
+# ==================================================
+def _lookup_cached_answer(user_query, k, personalized, retrieved):
+    """
+    Retrieve passages (unless already `retrieved`) and check the response cache.
+    Returns (indices, distances, query_embedding, cached_answer); query_embedding
+    is None when the answer must not be cached.
+    """
+    indices, distances = retrieved if retrieved is not None else retrieve_relevant_articles(user_query, k)
+    if personalized or len(indices) == 0:
+        return indices, distances, None, None
+
+    try:
+        query_embedding = get_query_embedding(user_query, model=EMBEDDING_MODEL)  # already cached by retrieval
+    except Exception:
+        # Keyword-only retrieval (embeddings unavailable): answer without the cache
+        return indices, distances, None, None
+
+    cached_answer = response_cache.get(query_embedding, indices, CHAT_MODEL, retrieval_engine.fingerprint)
+    return indices, distances, query_embedding, cached_answer
+
+def _store_answer(query_embedding, indices, answer):
+    if query_embedding is not None and not answer.endswith(COMPLETION_ERROR_MESSAGES):
+        response_cache.set(query_embedding, indices, CHAT_MODEL, retrieval_engine.fingerprint, answer)
+
+# Last link of the fallback chain: when every model failed, a cached answer to a
+# fairly similar question about the same passages beats an apology
+SEMANTIC_CACHE_FALLBACK_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_FALLBACK_THRESHOLD", "0.85"))
+
+def _fallback_cached_answer(user_query, indices):
+    if len(indices) == 0:
+        return None
+    try:
+        query_embedding = get_query_embedding(user_query, model=EMBEDDING_MODEL)
+    except Exception:
+        return None
+    answer = response_cache.get(
+        query_embedding, indices, CHAT_MODEL, retrieval_engine.fingerprint, threshold=SEMANTIC_CACHE_FALLBACK_THRESHOLD
+    )
+    if answer is not None:
+        inc("openai_fallbacks_total", labels={"endpoint": "chat", "to": "cache"},
+            help_text="Calls answered by a fallback model or cached answer")
+    return answer
+
+# Stateless answers (no conversation history) in flight, keyed by model, passages and normalized query
+answer_flight = SingleFlight("rag_completion")
+
+def _answer_flight_key(user_query, indices):
+    normalized = normalize_query(user_query) or user_query.strip()
+    request_key = json.dumps([CHAT_MODEL, [int(i) for i in indices], normalized])
+    return hashlib.sha256(request_key.encode("utf-8")).hexdigest()
+
+def _route_answer(user_query, distances, intent, history):
+    # Pick the model tier for this answer (see model_router.py)
+    return get_model_router(CHAT_MODEL).route(user_query, distances, intent, has_history=bool(history))
+
+def answer_with_context(user_query, k=2, personalized=False, retrieved=None, history=None, intent=None):
+    """
+    Answer the user query with retrieved article context.
+    Reuses a cached answer when a similar question retrieved the same passages;
+    personalized turns (e.g. ones that depend on earlier conversation) skip the cache.
+    Pass `retrieved` (indices, distances) when retrieval already ran for this query,
+    `history` (earlier turns of this conversation) for multi-turn context and the
+    detected `intent` to help pick the model tier.
+    """
+    personalized = personalized or bool(history)
+    indices, distances, query_embedding, cached_answer = _lookup_cached_answer(user_query, k, personalized, retrieved)
+    if cached_answer is not None:
+        return cached_answer
+
+    rag_prompt = build_prompt_with_context(user_query, k, indices=indices)
+    decision = _route_answer(user_query, distances, intent, history)
+
+    def complete():
+        messages = [{"role": "user", "content": rag_prompt}]
+        answer = get_completion_from_messages(messages, model=decision.model, history=history)
+        if answer in COMPLETION_ERROR_MESSAGES:
+            return answer
+        # Unsure fast-tier answers get one retry on the strong tier (within budget)
+        escalation = get_model_router(CHAT_MODEL).escalation(decision, user_query, answer)
+        if escalation is not None:
+            escalated = get_completion_from_messages(messages, model=escalation.model, history=history)
+            if escalated not in COMPLETION_ERROR_MESSAGES:
+                answer = escalated
+        return answer
+
+    if personalized:
+        answer = complete()
+    else:
+        # Identical stateless questions in flight at the same time share one completion
+        answer = answer_flight.do(_answer_flight_key(user_query, indices), complete)
+
+    _store_answer(query_embedding, indices, answer)
+    if answer in COMPLETION_ERROR_MESSAGES:
+        answer = _fallback_cached_answer(user_query, indices) or answer
+    return answer
+
+def stream_answer_with_context(user_query, k=2, personalized=False, retrieved=None, history=None, intent=None):
+    """
+    Streaming variant of answer_with_context for the chat UI.
+    A cached answer is yielded in one piece; otherwise tokens are yielded as they arrive.
+    """
+    personalized = personalized or bool(history)
+    indices, distances, query_embedding, cached_answer = _lookup_cached_answer(user_query, k, personalized, retrieved)
+    if cached_answer is not None:
+        yield cached_answer
+        return
+
+    flight = None
+    if not personalized:
+        flight = answer_flight.begin(_answer_flight_key(user_query, indices))
+        if not flight.leader:
+            # The same question is already being answered: reuse that answer in one piece
+            try:
+                yield flight.wait(answer_flight.timeout)
+            except Exception as e:
+                print(f"[Single Flight] Shared answer failed: {e}")
+                yield UNEXPECTED_ERROR_MESSAGE
+            return
+
+    parts = []
+    answer = None
+    try:
+        # Inside the try so a failed prompt build or routing still releases followers
+        rag_prompt = build_prompt_with_context(user_query, k, indices=indices)
+        decision = _route_answer(user_query, distances, intent, history)
+        for delta in stream_completion_from_messages(
+            [{"role": "user", "content": rag_prompt}], model=decision.model, history=history
+        ):
+            if not parts and delta in COMPLETION_ERROR_MESSAGES:
+                fallback_answer = _fallback_cached_answer(user_query, indices)
+                if fallback_answer is not None:
+                    # Not stored again: it answered a different (similar) question
+                    query_embedding, delta = None, fallback_answer
+            parts.append(delta)
+            yield delta
+        answer = "".join(parts)
+    finally:
+        if flight is not None:
+            if answer is None:
+                # Failed or abandoned (e.g. the visitor left): don't leave followers waiting
+                flight.reject(RuntimeError("Streaming answer was interrupted"))
+            else:
+                flight.resolve(answer)
+
+    _store_answer(query_embedding, indices, answer)
+
+# ==================================================
+# Conversation Memory (recent turns + rolling summary)
+# ==================================================
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "250"))
+
+def summarize_conversation(previous_summary, turns):
+    # Runs on the summarizer's background thread, never inside a chat turn
+    client = get_openai_client()
+    model = get_model_router(CHAT_MODEL).fast_model
+    response = call_openai(f"chat:{model}", lambda timeout: client.chat.completions.create(
+        model=model,
+        messages=build_summary_messages(previous_summary, turns),
+        temperature=0,
+        max_tokens=SUMMARY_MAX_TOKENS,
+        timeout=timeout
+    ), timeout=30)
+    record_usage(response.usage, model)
+    return response.choices[0].message.content
+
+def conversation_history(conversation_id):
+    """
+    Earlier conversation to send with the next turn: running summary + recent turns.
+    """
+    offset, turns = conversation_store.window(conversation_id)
+    return get_conversation_summarizer(summarize_conversation).context(conversation_id, offset, turns)
+
+def remember_turn(conversation_id, user_message, reply):
+    """
+    Add one exchange to the server-side conversation history (failed replies are left out)
+    and fold turns that left the recent window into the summary in the background.
+    """
+    conversation_store.append(conversation_id, "user", user_message)
+    if reply and not reply.endswith(COMPLETION_ERROR_MESSAGES):
+        conversation_store.append(conversation_id, "assistant", reply)
+    if conversation_id:
+        offset, turns = conversation_store.window(conversation_id)
+        get_conversation_summarizer(summarize_conversation).refresh(conversation_id, offset, turns)
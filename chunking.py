@@ -0,0 +1,105 @@
+import re
+
+# ==========================================================
+# Passage-level chunking of the RAG articles
+# ==========================================================
+# Articles are split into overlapping, token-bounded passages on word
+# boundaries. Each passage keeps its parent title, the index of the parent
+# article and its character span, so adjacent hits can be merged back into one
+# continuous excerpt when the prompt is assembled.
+
+_WORD = re.compile(r"\S+")
+
+
+def estimate_tokens(text):
+    """
+    Rough token count (~4 characters per token, at least one per word).
+    """
+    return max(len(text) // 4 + 1, len(text.split()))
+
+
+def _split_content(content, max_tokens, overlap_tokens, count_tokens):
+    words = [(match.start(), match.end()) for match in _WORD.finditer(content)]
+    costs = [count_tokens(content[start:end]) for start, end in words]
+
+    spans = []
+    first = 0
+    while first < len(words):
+        last = first
+        total = costs[first]
+        while last + 1 < len(words) and total + costs[last + 1] <= max_tokens:
+            last += 1
+            total += costs[last]
+        spans.append((words[first][0], words[last][1]))
+
+        if last + 1 >= len(words):
+            break
+
+        # Step back far enough to repeat ~overlap_tokens of context, but always advance
+        next_first = last + 1
+        overlap = 0
+        while next_first - 1 > first and overlap + costs[next_first - 1] <= overlap_tokens:
+            next_first -= 1
+            overlap += costs[next_first]
+        first = next_first
+
+    return spans
+
+
+def split_articles(articles, max_tokens=300, overlap_tokens=50, count_tokens=estimate_tokens):
+    """
+    Split articles into passages: dicts with title, content, article_index, start and end.
+    Articles without usable content are skipped.
+    """
+    passages = []
+    for article_index, article in enumerate(articles):
+        content = article.get("content")
+        if not content or not isinstance(content, str) or not content.strip():
+            continue
+        for start, end in _split_content(content, max_tokens, overlap_tokens, count_tokens):
+            passages.append({
+                "title": article.get("title", ""),
+                "content": content[start:end],
+                "article_index": article_index,
+                "start": start,
+                "end": end,
+            })
+    return passages
+
+
+def passage_embedding_text(passage):
+    """
+    Text used to embed a passage; the parent title gives short passages context.
+    """
+    return f"{passage['title']}\n{passage['content']}"
+
+
+def merge_passages(passages, articles):
+    """
+    Merge overlapping or adjacent passages from the same article into single
+    excerpts. Excerpts are returned in the rank order of their best passage.
+    """
+    groups = {}
+    order = []
+    for passage in passages:
+        index = passage["article_index"]
+        if index not in groups:
+            groups[index] = []
+            order.append(index)
+        groups[index].append((passage["start"], passage["end"]))
+
+    merged = []
+    for index in order:
+        content = articles[index]["content"]
+        spans = sorted(groups[index])
+        current_start, current_end = spans[0]
+        for start, end in spans[1:]:
+            # Only whitespace between the spans: treat them as one excerpt
+            if start <= current_end or not content[current_end:start].strip():
+                current_end = max(current_end, end)
+            else:
+                merged.append({"title": articles[index]["title"], "content": content[current_start:current_end]})
+                current_start, current_end = start, end
+        merged.append({"title": articles[index]["title"], "content": content[current_start:current_end]})
+
+    return merged
@@ -0,0 +1,179 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from metrics import register_collector
+
+# ==========================================================
+# Server-side conversation memory (UI sessions and API senders)
+# ==========================================================
+# Turns are kept per conversation id ("ui:<session_id>" or "api:<sender_id>",
+# so neither side can address the other's conversations) as compact
+# (role, text) tuples, newest MAX_TURNS only. Idle conversations are evicted
+# by LRU size and TTL. With CONVERSATION_DB_PATH set, turns are also written
+# to SQLite so every worker process sees the same conversation; each read only
+# fetches rows newer than what is cached.
+
+_ROLES = {"u": "user", "a": "assistant", "s": "system"}
+_CODES = {role: code for code, role in _ROLES.items()}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation_turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversation_turns ON conversation_turns(conversation_id, id);
+"""
+
+
+class _Conversation:
+    __slots__ = ("turns", "offset", "last_row_id", "touched_at")
+
+    def __init__(self):
+        self.turns = []
+        self.offset = 0  # turns dropped from the front (older than max_turns)
+        self.last_row_id = 0
+        self.touched_at = time.monotonic()
+
+
+class ConversationStore:
+    """
+    Thread-safe conversation history with LRU/TTL eviction and optional SQLite persistence.
+    """
+
+    def __init__(self, max_conversations=5000, ttl=86400, max_turns=40, db_path=None):
+        self.max_conversations = max(1, int(max_conversations))
+        self.ttl = ttl or None
+        self.max_turns = max(1, int(max_turns))
+        self.db_path = db_path
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if db_path:
+            self._connect().executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, conversation_id):
+        # Caller holds the lock
+        now = time.monotonic()
+        conversation = self._conversations.get(conversation_id)
+        if conversation is not None and self.ttl and now - conversation.touched_at > self.ttl:
+            del self._conversations[conversation_id]
+            conversation = None
+        if conversation is None:
+            conversation = self._conversations[conversation_id] = _Conversation()
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        self._conversations.move_to_end(conversation_id)
+        conversation.touched_at = now
+        return conversation
+
+    def _sync_from_db(self, conversation_id, conversation):
+        # Caller holds the lock; pulls turns written by other workers
+        rows = self._connect().execute(
+            "SELECT id, role, content FROM conversation_turns "
+            "WHERE conversation_id = ? AND id > ? ORDER BY id DESC LIMIT ?",
+            (conversation_id, conversation.last_row_id, self.max_turns)
+        ).fetchall()
+        if not rows:
+            return
+        new_turns = [(_CODES.get(role, "u"), content) for _, role, content in reversed(rows)]
+        if conversation.last_row_id == 0 or len(rows) == self.max_turns:
+            # First load, or older rows may have been skipped: the fetched rows
+            # are the whole window and the offset is counted in the database
+            conversation.turns = new_turns
+            conversation.offset = self._connect().execute(
+                "SELECT COUNT(*) FROM conversation_turns WHERE conversation_id = ? AND id < ?",
+                (conversation_id, rows[-1][0])
+            ).fetchone()[0]
+        else:
+            conversation.turns.extend(new_turns)
+            self._trim(conversation)
+        conversation.last_row_id = rows[0][0]
+
+    def _trim(self, conversation):
+        excess = len(conversation.turns) - self.max_turns
+        if excess > 0:
+            del conversation.turns[:excess]
+            conversation.offset += excess
+
+    def window(self, conversation_id):
+        """
+        Return (offset, turns): the retained turns as [{"role", "content"}], oldest
+        first, and how many earlier turns of the conversation are no longer kept.
+        """
+        if not conversation_id:
+            return 0, []
+        with self._lock:
+            conversation = self._get(conversation_id)
+            if self.db_path:
+                self._sync_from_db(conversation_id, conversation)
+            offset, turns = conversation.offset, list(conversation.turns)
+        return offset, [{"role": _ROLES[code], "content": content} for code, content in turns]
+
+    def history(self, conversation_id, limit=None):
+        """
+        Return the conversation as [{"role", "content"}], oldest first.
+        """
+        turns = self.window(conversation_id)[1]
+        return turns[-limit:] if limit else turns
+
+    def append(self, conversation_id, role, content):
+        if not conversation_id or not content:
+            return
+        with self._lock:
+            conversation = self._get(conversation_id)
+            if self.db_path:
+                # Catch up first so turns from other workers stay in order; the
+                # write lock keeps another worker from inserting in between
+                conn = self._connect()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._sync_from_db(conversation_id, conversation)
+                    cursor = conn.execute(
+                        "INSERT INTO conversation_turns (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                        (conversation_id, role, content, time.time())
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                conversation.last_row_id = cursor.lastrowid
+            conversation.turns.append((_CODES[role], content))
+            self._trim(conversation)
+
+    def clear(self, conversation_id):
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+            if self.db_path:
+                self._connect().execute(
+                    "DELETE FROM conversation_turns WHERE conversation_id = ?", (conversation_id,)
+                )
+
+    def __len__(self):
+        return len(self._conversations)
+
+
+# Shared by the Streamlit sessions and the Flask API in this process
+conversation_store = ConversationStore(
+    max_conversations=int(os.getenv("CONVERSATION_CACHE_SIZE", "5000")),
+    ttl=float(os.getenv("CONVERSATION_TTL", "86400")),
+    max_turns=int(os.getenv("CONVERSATION_MAX_TURNS", "40")),
+    db_path=os.getenv("CONVERSATION_DB_PATH") or None,
+)
+register_collector(lambda: [("conversations_in_memory", "gauge", {}, len(conversation_store))])
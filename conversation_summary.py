@@ -0,0 +1,128 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from caching import LRUCache
+from metrics import inc, register_cache, timed
+
+# ==========================================================
+# Rolling conversation summary for long chats
+# ==========================================================
+# Only the last KEEP_RECENT turns are sent verbatim. Older turns are folded into
+# a short running summary that is sent as one extra system message, so prompt
+# size stays roughly flat however long the chat gets. Summaries are refreshed
+# incrementally (previous summary + newly evicted turns) on a background
+# thread; a turn never waits for one and uses the latest summary available.
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a chat between a website visitor and Terra, "
+    "TerraPeak Consulting's assistant. Update the summary with the new turns. Keep facts "
+    "the visitor shared (company, market, goals, needs, constraints, open questions) and "
+    "what was already answered or offered. Be concise and write in English."
+)
+
+
+def build_summary_messages(previous_summary, turns):
+    """
+    Messages asking the model to fold `turns` into `previous_summary`.
+    """
+    transcript = "\n".join(f"{turn['role'].capitalize()}: {turn['content']}" for turn in turns)
+    return [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": (
+            f"Current summary:\n{previous_summary or '(none yet)'}\n\n"
+            f"New turns:\n{transcript}\n\n"
+            "Updated summary:"
+        )},
+    ]
+
+
+class ConversationSummarizer:
+    """
+    Per-conversation running summaries of the turns older than `keep_recent`.
+    summarize_fn(previous_summary, turns) returns the updated summary text.
+    """
+
+    def __init__(self, summarize_fn, keep_recent=6, maxsize=5000, ttl=86400, workers=2):
+        self.summarize_fn = summarize_fn
+        self.keep_recent = max(1, int(keep_recent))
+        self._summaries = LRUCache(maxsize=maxsize, ttl=ttl)  # conversation_id -> (summary, covered)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summarizer")
+
+    def context(self, conversation_id, offset, turns):
+        """
+        Return the messages to send as conversation history: the running summary
+        (as a system message, when there is one) followed by the recent turns.
+        `offset` is the number of turns before `turns[0]` (see ConversationStore.window).
+        Schedules a background refresh when turns fell out of the recent window.
+        """
+        recent = turns[-self.keep_recent:]
+        summary = self.refresh(conversation_id, offset, turns)
+        if not summary:
+            return recent
+        return [{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}] + recent
+
+    def refresh(self, conversation_id, offset, turns):
+        """
+        Start folding newly evicted turns into the summary; returns the current summary.
+        """
+        if not conversation_id:
+            return None
+        summary, covered = self._summaries.get(conversation_id) or (None, 0)
+        if covered > offset + len(turns):
+            # The stored conversation was evicted and restarted; the summary is stale
+            summary, covered = None, 0
+            self._summaries.set(conversation_id, (None, 0))
+
+        target = offset + max(0, len(turns) - self.keep_recent)
+        if target > covered:
+            with self._lock:
+                schedule = conversation_id not in self._pending
+                self._pending.add(conversation_id)
+            if schedule:
+                # Turns older than the store keeps can no longer be folded in
+                new_turns = turns[max(0, covered - offset):target - offset]
+                self._executor.submit(self._fold, conversation_id, summary, covered, new_turns, target)
+        return summary
+
+    def _fold(self, conversation_id, summary, covered, new_turns, target):
+        try:
+            with timed("summary"):
+                updated = self.summarize_fn(summary, new_turns)
+            if updated:
+                current = self._summaries.get(conversation_id) or (None, 0)
+                if current[1] == covered:
+                    self._summaries.set(conversation_id, (updated.strip(), target))
+            inc("conversation_summaries_total", labels={"status": "ok"}, help_text="Background summary refreshes")
+        except Exception as e:
+            print(f"[Summary Error] {e}")
+            inc("conversation_summaries_total", labels={"status": "error"}, help_text="Background summary refreshes")
+        finally:
+            with self._lock:
+                self._pending.discard(conversation_id)
+
+    def stats(self):
+        return self._summaries.stats()
+
+
+_summarizer = None
+_summarizer_lock = threading.Lock()
+
+
+def get_conversation_summarizer(summarize_fn):
+    """
+    Return the process-wide summarizer (created with summarize_fn on first use).
+    """
+    global _summarizer
+    with _summarizer_lock:
+        if _summarizer is None:
+            _summarizer = ConversationSummarizer(
+                summarize_fn,
+                keep_recent=int(os.getenv("SUMMARY_KEEP_RECENT", "6")),
+                maxsize=int(os.getenv("CONVERSATION_CACHE_SIZE", "5000")),
+                ttl=float(os.getenv("CONVERSATION_TTL", "86400")),
+                workers=int(os.getenv("SUMMARY_WORKERS", "2")),
+            )
+            register_cache("conversation_summary", _summarizer)
+        return _summarizer
@@ -0,0 +1,130 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+# ======================================================
+# Persistent on-disk embedding cache for the RAG corpus
+# ======================================================
+# Layout inside the cache directory:
+#   manifest.json            -> {"model", "dim", "matrix", "rows": {content_hash: row}}
+#   embeddings-<digest>.npy  -> float32 matrix, one row per cached text
+# The manifest always points at a complete matrix file, so a reader in another
+# worker never sees a half-written cache.
+
+MANIFEST_NAME = "manifest.json"
+
+
+def content_hash(text, model):
+    """
+    Stable key for a piece of text embedded with a given model.
+    """
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.strip().encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _atomic_write(path, write_fn, suffix=""):
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            write_fn(handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class EmbeddingStore:
+    """
+    Content-addressed embedding cache backed by a memory-mapped .npy matrix.
+    Only texts whose content (or embedding model) changed are re-embedded.
+    """
+
+    def __init__(self, directory, model):
+        self.directory = directory
+        self.model = model
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+
+    def _load(self):
+        """
+        Return (rows, matrix) from disk, or ({}, None) when there is no usable cache.
+        """
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as handle:
+                manifest = json.load(handle)
+            if manifest.get("model") != self.model:
+                return {}, None
+            matrix = np.load(os.path.join(self.directory, manifest["matrix"]), mmap_mode="r")
+            if matrix.ndim != 2 or matrix.shape[1] != manifest.get("dim"):
+                return {}, None
+            return manifest.get("rows", {}), matrix
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"[Embedding Cache] Ignoring unreadable cache: {e}")
+            return {}, None
+
+    def _save(self, keys, matrix):
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256("".join(keys).encode("utf-8")).hexdigest()[:16]
+        matrix_name = f"embeddings-{digest}.npy"
+        matrix_path = os.path.join(self.directory, matrix_name)
+
+        _atomic_write(matrix_path, lambda handle: np.save(handle, matrix), suffix=".npy")
+        manifest = {
+            "model": self.model,
+            "dim": int(matrix.shape[1]),
+            "matrix": matrix_name,
+            "rows": {key: row for row, key in enumerate(keys)},
+        }
+        _atomic_write(
+            self.manifest_path,
+            lambda handle: handle.write(json.dumps(manifest).encode("utf-8")),
+            suffix=".json",
+        )
+
+        # Drop matrices no longer referenced by the manifest
+        for name in os.listdir(self.directory):
+            if name.startswith("embeddings-") and name.endswith(".npy") and name != matrix_name:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def embed_corpus(self, texts, embed_batch):
+        """
+        Return a float32 matrix with one embedding row per text, reusing cached rows
+        and calling embed_batch(texts) once for the texts not in the cache yet.
+        """
+        keys = [content_hash(text, self.model) for text in texts]
+        rows, cached = self._load()
+
+        vectors = {}
+        for key in set(keys):
+            if cached is not None and key in rows:
+                vectors[key] = np.asarray(cached[rows[key]], dtype="float32")
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            new_vectors = np.asarray(embed_batch(list(missing.values())), dtype="float32")
+            for key, vector in zip(missing, new_vectors):
+                vectors[key] = vector
+
+        matrix = np.ascontiguousarray(np.stack([vectors[key] for key in keys]), dtype="float32")
+
+        # Rewrite the cache only when the corpus actually changed
+        if missing or cached is None or set(rows) != set(keys):
+            try:
+                unique_keys = list(dict.fromkeys(keys))
+                self._save(unique_keys, np.stack([vectors[key] for key in unique_keys]))
+            except OSError as e:
+                print(f"[Embedding Cache] Failed to persist embeddings: {e}")
+
+        return matrix
@@ -0,0 +1,150 @@
+import os
+import re
+import time
+import openai
+import numpy as np
+from openai_client import get_openai_client
+from caching import LRUCache
+from metrics import register_cache, timed
+from single_flight import SingleFlight
+from resilience import call_openai
+
+# ============================================================
+# Embedding helpers (OpenAI SDK v1.x)
+# ============================================================
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# OpenAI limits: 2048 inputs per request and ~300k tokens summed over all inputs.
+# We stay well below both so one oversized article can't push a batch over.
+MAX_BATCH_SIZE = 2048
+MAX_TOKENS_PER_REQUEST = 250_000
+
+# Query embeddings sit on the critical path of every turn: give up quickly (the
+# retrieval engine then falls back to keyword search) instead of waiting 30s
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "5"))
+EMBEDDING_DEADLINE = float(os.getenv("EMBEDDING_DEADLINE", "10"))
+
+# Query embeddings keyed by normalized query text. Website traffic repeats the same
+# few questions, so hits skip a network round-trip before retrieval.
+query_embedding_cache = LRUCache(
+    maxsize=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "86400")),
+)
+register_cache("query_embedding", query_embedding_cache)
+_query_embedding_flight = SingleFlight("query_embedding")
+
+
+def _estimate_tokens(text):
+    """
+    Cheap upper-bound token estimate (~3 characters per token) used for batching.
+    """
+    return len(text) // 3 + 1
+
+
+def _clean(text):
+    if not text or not isinstance(text, str) or not text.strip():
+        raise ValueError("Text for embedding must be a non-empty string.")
+    return text.strip()
+
+
+def get_embedding(text, model=EMBEDDING_MODEL):
+    """
+    Generate a numeric embedding for a given text using OpenAI's new SDK (v1.x).
+    """
+    text = _clean(text)
+
+    client = get_openai_client()
+
+    with timed("embedding"):
+        response = call_openai("embeddings", lambda timeout: client.embeddings.create(
+            input=text,
+            model=model,
+            timeout=timeout
+        ), timeout=EMBEDDING_TIMEOUT, deadline=time.monotonic() + EMBEDDING_DEADLINE)
+
+    embedding = response.data[0].embedding
+    return np.array(embedding)
+
+
+def _batches(texts, batch_size, max_tokens):
+    """
+    Yield (start, end) slices that respect both the input count and token budget.
+    """
+    start = 0
+    while start < len(texts):
+        end = start
+        tokens = 0
+        while end < len(texts) and end - start < batch_size:
+            cost = _estimate_tokens(texts[end])
+            if end > start and tokens + cost > max_tokens:
+                break
+            tokens += cost
+            end += 1
+        yield start, end
+        start = end
+
+
+def _embed_batch(client, texts, model):
+    try:
+        response = call_openai("embeddings", lambda timeout: client.embeddings.create(
+            input=texts, model=model, timeout=timeout
+        ), timeout=30)
+    except openai.BadRequestError:
+        # The batch was still too large for the API: split it and try each half
+        if len(texts) == 1:
+            raise
+        middle = len(texts) // 2
+        return _embed_batch(client, texts[:middle], model) + _embed_batch(client, texts[middle:], model)
+
+    # The API may return items out of order; `index` is authoritative
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def get_embeddings(texts, model=EMBEDDING_MODEL, batch_size=MAX_BATCH_SIZE, max_tokens=MAX_TOKENS_PER_REQUEST):
+    """
+    Embed many texts with as few requests as possible.
+    Returns a contiguous float32 matrix (len(texts) x dim) ready for `index.add`.
+    """
+    texts = [_clean(text) for text in texts]
+    if not texts:
+        raise ValueError("At least one text is required for embedding.")
+
+    client = get_openai_client()
+
+    vectors = []
+    for start, end in _batches(texts, max(1, min(batch_size, MAX_BATCH_SIZE)), max_tokens):
+        with timed("embedding_batch"):
+            vectors.extend(_embed_batch(client, texts[start:end], model))
+
+    return np.ascontiguousarray(vectors, dtype="float32")
+
+
+def normalize_query(text):
+    """
+    Collapse case, whitespace and trailing punctuation so trivially different
+    spellings of the same question share one cache entry.
+    """
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip(" ?!.")
+
+
+def get_query_embedding(query, model=EMBEDDING_MODEL):
+    """
+    get_embedding for user queries, served from query_embedding_cache when possible.
+    """
+    normalized = normalize_query(_clean(query)) or query.strip()
+    key = (model, normalized)
+
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        # Concurrent misses for the same query (e.g. intent and retrieval of one
+        # turn, or a burst of identical questions) share one API call
+        embedding = _query_embedding_flight.do(key, lambda: _embed_and_cache(key, normalized, model))
+    return embedding
+
+
+def _embed_and_cache(key, text, model):
+    embedding = get_embedding(text, model=model).astype("float32")
+    embedding.setflags(write=False)  # shared between callers
+    query_embedding_cache.set(key, embedding)
+    return embedding
@@ -0,0 +1,146 @@
+import threading
+from collections import namedtuple
+import numpy as np
+
+# ======================================================
+# Local intent classification (handoff / general / other)
+# ======================================================
+# 1. Fast path: unambiguous requests for a person are a handoff, no model needed.
+#    Looser phrases ("live chat", "can i speak") also appear in product
+#    questions on a chatbot site, so they only count when the centroid agrees.
+# 2. Nearest centroid: compare the query embedding (already needed for retrieval,
+#    so usually a cache hit) with per-intent centroids built from example phrases.
+# 3. Only when the top two intents are too close do we ask the LLM.
+
+INTENTS = ("handoff", "general", "other")
+
+HANDOFF_PHRASES = [
+    "talk to someone", "speak to someone", "contact consultant", "want a call",
+    "need a meeting", "book a call", "real person", "human support"
+]
+
+# Keyword list used when no model is available (the baseline GPT fallback)
+LIVE_CHAT_TRIGGERS = HANDOFF_PHRASES + [
+    "i want to talk", "can i speak", "live chat", "contact support"
+]
+
+INTENT_EXAMPLES = {
+    "handoff": [
+        "Can I talk to a consultant?",
+        "I would like to speak with a real person.",
+        "Please have someone call me back.",
+        "Can we schedule a meeting with your team?",
+        "I want to book a call with TerraPeak.",
+        "Connect me to a human, please.",
+        "Is there a consultant available to talk to me now?",
+        "How do I set up an appointment with an advisor?",
+    ],
+    "general": [
+        "What does TerraPeak do?",
+        "How much does the chatbot cost?",
+        "What is your pricing for the AI Ordering Assistant?",
+        "Can you help my company enter the Singapore market?",
+        "Do you offer sales training for SMEs?",
+        "How long does it take to set up AI automation?",
+        "Hi, how are you?",
+        "Which industries do you work with?",
+        "Tell me about your market expansion services in APAC.",
+    ],
+    "other": [
+        "What's the weather like today?",
+        "Tell me a joke.",
+        "Who won the football match yesterday?",
+        "Can you write my homework essay?",
+        "What is the capital of France?",
+        "asdf qwerty",
+        "Recommend a good movie to watch tonight.",
+    ],
+}
+
+IntentResult = namedtuple("IntentResult", ["label", "confidence", "source"])
+
+
+def match_live_chat_trigger(text, triggers=LIVE_CHAT_TRIGGERS):
+    lowered = text.lower()
+    return any(trigger in lowered for trigger in triggers)
+
+
+def _unit_rows(matrix):
+    matrix = np.asarray(matrix, dtype="float32")
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class IntentClassifier:
+    """
+    Embedding nearest-centroid intent classifier with keyword fast path.
+    `confidence` is the cosine margin between the best and second-best intent.
+    """
+
+    def __init__(self, centroids, embed_query, min_margin=0.04):
+        self.labels = list(centroids)
+        self.centroids = _unit_rows(np.stack([centroids[label] for label in self.labels]))
+        self.embed_query = embed_query
+        self.min_margin = min_margin
+
+    @classmethod
+    def from_examples(cls, examples, embed_batch, embed_query, **kwargs):
+        """
+        Build centroids by embedding all example phrases in one batch.
+        """
+        texts = [text for label in examples for text in examples[label]]
+        vectors = _unit_rows(embed_batch(texts))
+
+        centroids = {}
+        offset = 0
+        for label in examples:
+            count = len(examples[label])
+            centroids[label] = vectors[offset:offset + count].mean(axis=0)
+            offset += count
+        return cls(centroids, embed_query, **kwargs)
+
+    def score(self, text):
+        """
+        Return (label, margin) for the closest centroid.
+        """
+        query = _unit_rows(self.embed_query(text))
+        scores = self.centroids @ query
+        order = np.argsort(scores)[::-1]
+        margin = float(scores[order[0]] - scores[order[1]]) if len(order) > 1 else 1.0
+        return self.labels[order[0]], margin
+
+    def classify(self, text, llm_classify=None):
+        """
+        Return an IntentResult; llm_classify(text) is consulted only when the
+        local margin is below min_margin.
+        """
+        if match_live_chat_trigger(text, HANDOFF_PHRASES):
+            return IntentResult("handoff", 1.0, "rules")
+
+        label, margin = self.score(text)
+        if label == "handoff" and match_live_chat_trigger(text):
+            # A looser trigger phrase backed by the centroid: no need to ask the LLM
+            return IntentResult("handoff", margin, "rules")
+        if margin >= self.min_margin or llm_classify is None:
+            return IntentResult(label, margin, "embedding")
+
+        return IntentResult(llm_classify(text), margin, "llm")
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier(build_fn):
+    """
+    Return the process-wide classifier, building it with build_fn() on first use.
+    """
+    global _classifier
+    if _classifier is not None:
+        return _classifier
+
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = build_fn()
+        return _classifier
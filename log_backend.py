@@ -1,18 +1,183 @@
 import os
-import csv
+import time
+import sqlite3
+import datetime
+import threading
+
+# ==========================================================
+# Durable local interaction log (SQLite, WAL mode)
+# ==========================================================
+# Every chat/contact log row lands here first. It is the source of truth that
+# remote sinks (the Google Sheets writer) replay from, so a Sheets outage never
+# blocks or loses a chat turn. WAL mode lets several Streamlit/gunicorn worker
+# processes append concurrently while others read.
+
+# Same columns (and order) as the "Chatlogs Terrapeak" sheet
+LOG_FIELDS = [
+    "timestamp", "name", "email", "company", "phone", "country", "question",
+    "response", "intent", "cta_triggered", "message_number", "session_id"
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    name TEXT, email TEXT, company TEXT, phone TEXT, country TEXT,
+    question TEXT, response TEXT, intent TEXT, cta_triggered TEXT,
+    message_number INTEGER, session_id TEXT,
+    claimed_until REAL,
+    synced_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_interactions_session ON interactions(session_id);
+CREATE INDEX IF NOT EXISTS idx_interactions_email ON interactions(email);
+CREATE INDEX IF NOT EXISTS idx_interactions_pending ON interactions(id) WHERE synced_at IS NULL;
+"""
+
+
+# Logs written before message_number was an INTEGER column hold it as text
+NUMERIC_FIELDS = {"message_number"}
+
+
+def _sheet_value(field, value):
+    if field in NUMERIC_FIELDS and isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+
+def default_log_path():
+    # Keep using the mounted /data volume when it exists (as the CSV log did)
+    data_dir = "/data" if os.path.isdir("/data") else "."
+    return os.getenv("LOG_DB_PATH", os.path.join(data_dir, "interactions.db"))
+
+
+class InteractionLog:
+    """
+    Append-only interaction store, safe for multiple threads and processes.
+    Each thread gets its own SQLite connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Autocommit mode; multi-statement work uses explicit BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # NORMAL in WAL mode syncs at checkpoints instead of every commit
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, data, timestamp=None):
+        """
+        Store one interaction (a dict using LOG_FIELDS keys) and return its row id.
+        """
+        row = dict(data)
+        row["timestamp"] = timestamp or row.get("timestamp") or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Raw values, so numbers replay to the sheet as numbers (as append_row did)
+        values = [row.get(field, "") for field in LOG_FIELDS]
+
+        cursor = self._connect().execute(
+            f"INSERT INTO interactions ({', '.join(LOG_FIELDS)}) VALUES ({', '.join('?' * len(LOG_FIELDS))})",
+            values
+        )
+        return cursor.lastrowid
+
+    def find(self, session_id=None, email=None, limit=100):
+        """
+        Return the most recent interactions for a session id and/or email as dicts.
+        """
+        clauses, params = [], []
+        if session_id:
+            clauses.append("session_id = ?")
+            params.append(session_id)
+        if email:
+            clauses.append("email = ?")
+            params.append(email)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        rows = self._connect().execute(
+            f"SELECT {', '.join(LOG_FIELDS)} FROM interactions {where} ORDER BY id DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [dict(zip(LOG_FIELDS, row)) for row in rows]
+
+    def claim_pending(self, limit, lease_seconds=300):
+        """
+        Lease up to `limit` rows that are not yet synced to the remote sink.
+        Returns [(id, [values in LOG_FIELDS order])]. Rows whose lease expires
+        (e.g. the worker died) become claimable again.
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT id, {', '.join(LOG_FIELDS)} FROM interactions "
+                "WHERE synced_at IS NULL AND (claimed_until IS NULL OR claimed_until < ?) "
+                "ORDER BY id LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            if rows:
+                ids = [row[0] for row in rows]
+                conn.execute(
+                    f"UPDATE interactions SET claimed_until = ? WHERE id IN ({', '.join('?' * len(ids))})",
+                    [now + lease_seconds] + ids
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(row[0], [_sheet_value(field, value) for field, value in zip(LOG_FIELDS, row[1:])])
+                for row in rows]
+
+    def mark_synced(self, ids):
+        if not ids:
+            return
+        synced_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._connect().execute(
+            f"UPDATE interactions SET synced_at = ?, claimed_until = NULL WHERE id IN ({', '.join('?' * len(ids))})",
+            [synced_at] + list(ids)
+        )
+
+    def release(self, ids):
+        if not ids:
+            return
+        self._connect().execute(
+            f"UPDATE interactions SET claimed_until = NULL WHERE id IN ({', '.join('?' * len(ids))})",
+            list(ids)
+        )
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_interaction_log():
+    """
+    Return the process-wide InteractionLog, opening the database on first use.
+    """
+    global _log
+    if _log is not None:
+        return _log
+
+    with _log_lock:
+        if _log is None:
+            _log = InteractionLog(default_log_path())
+        return _log
+
 
 def save_user_data(name, email, phone, country):
-    # Construct the file path within the mounted volume
-    file_path = os.path.join('/data', 'user_logs.csv')
-    file_exists = os.path.isfile(file_path)
-    with open(file_path, mode='a', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['name', 'email', 'phone', 'country']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow({
-            'name': name,
-            'email': email,
-            'phone': phone,
-            'country': country
-        })
+    get_interaction_log().append({
+        'name': name,
+        'email': email,
+        'phone': phone,
+        'country': country
+    })
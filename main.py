@@ -1,364 +1,31 @@
 import os
-import openai
 import streamlit as st
 import re
-from dotenv import load_dotenv, find_dotenv
-import numpy as np
-import faiss
-import pycountry
-import csv
-import logging
-from openai import OpenAIError, RateLimitError
-import json
-import datetime
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from gspread.auth import authorize
 import uuid
-from flask import Flask, request, jsonify
-
-# =============================
-# Load environment variables
-# ============================
-_ = load_dotenv(find_dotenv())
-
-st.markdown("""
-<style>
-/* === CHAT BUBBLES === */
-div[data-testid="stChatMessage"] div:has(div:has(img[alt="👤"])) {
-    justify-content: flex-end;
-    text-align: right;
-}
-div[data-testid="stChatMessage"] div:has(div:has(img[alt="👤"])) > div:nth-child(2) {
-    background-color: #dbe9f4;
-    border-radius: 12px;
-    padding: 10px 15px;
-    margin-bottom: 10px;
-    max-width: 80%;
-}
-div[data-testid="stChatMessage"] div:has(div:has(img[alt="🌍"])) {
-    justify-content: flex-start;
-    text-align: left;
-}
-div[data-testid="stChatMessage"] div:has(div:has(img[alt="🌍"])) > div:nth-child(2) {
-    background-color: #f1f0f0;
-    border-radius: 12px;
-    padding: 10px 15px;
-    margin-bottom: 10px;
-    max-width: 80%;
-}
-
-/* === FORM POSITIONING === */
-.contact-header {
-    margin-top: -50px;
-    padding-top: 0;
-}
-.contact-form {
-    margin-top: 0px;
-}
-form {
-    margin-bottom: 0px !important;
-    padding-bottom: 0px !important;
-}
-
-/* === LAYOUT FIXES === */
-.reportview-container, .main {
-    background-color: #f4f4f2;
-}
-div.block-container {
-    padding-top: 0rem;
-    padding-bottom: 0rem;
-}
-
-/* === TERRAPEAK HEADER === */
-.header {
-    background-color: #E0E0DB;
-    padding: 10px;
-    border-radius: 10px;
-    text-align: center;
-    margin-bottom: 20px;
-}
-.header img {
-    width: 50px;
-    height: 50px;
-    vertical-align: middle;
-}
-.header h1 {
-    display: inline;
-    margin-left: 10px;
-    vertical-align: middle;
-    color: #131313;
-    font-family: sans-serif;
-}
-</style>
-""", unsafe_allow_html=True)
-
-
-# ===================
-# OpenAI API Key
-# ===================
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-# ===========================
-# For debugging purposes
-# ===========================
-print("OPENAI_API_KEY:", os.getenv("OPENAI_API_KEY"))
-
-def authenticate_google_sheets():
-    creds = Credentials(
-        None,
-        refresh_token=os.getenv("GOOGLE_REFRESH_TOKEN"),
-        token_uri=os.getenv("GOOGLE_TOKEN_URI"),
-        client_id=os.getenv("GOOGLE_CLIENT_ID"),
-        client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-        scopes=[
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive"
-        ]
-    )
-    creds.refresh(Request())
-    client = authorize(creds)
-    return client
-
-# ================================
-# Logging Function to Google Sheet
-# ================================
-def log_to_google_sheets(data):
-    try:
-        client = authenticate_google_sheets()
-        sheet = client.open("Chatlogs Terrapeak").sheet1
-
-        row = [
-            datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            data.get("name", ""),
-            data.get("email", ""),
-            data.get("company", ""),
-            data.get("phone", ""),
-            data.get("country", ""),
-            data.get("question", ""),
-            data.get("response", ""),
-            data.get("intent", ""),
-            data.get("cta_triggered", ""),
-            data.get("message_number", ""),
-            data.get("session_id", "")
-        ]
-
-        sheet.append_row(row)
-        return True
-
-    except Exception as e:
-        print(f"[Google Sheets Logging Error] {e}")
-        return False
-
+from metrics import start_metrics_server, turn_span
+from static_assets import CHAT_CSS, CTA_HTML, HIDE_STREAMLIT_STYLE, country_names
+from turn_pipeline import classify_and_retrieve
+from chatbot import (
+    conversation_history, detect_intent, log_to_google_sheets,
+    remember_turn, retrieve_relevant_articles, stream_answer_with_context
+)
+
+# ==========================================================
+# Streamlit chat UI (re-executed on every interaction)
+# ==========================================================
+# Keep this file to UI code: the chatbot core (chatbot.py) and the static
+# assets (static_assets.py) are imported once per process and reused by reruns.
+# The Flask API lives in api.py (`gunicorn api:api`).
+
+# Expose this process's metrics (UI turns, first-token latency, ...) on METRICS_PORT
+start_metrics_server()
+
+st.markdown(CHAT_CSS, unsafe_allow_html=True)
 
 # ====================================================
 # Hide Streamlit's default menu, header, and footer
 # ====================================================
-hide_st_style = """
-            <style>
-            #MainMenu {visibility: hidden;}
-            footer {visibility: hidden;}
-            header {visibility: hidden;}
-            </style>
-            """
-st.markdown(hide_st_style, unsafe_allow_html=True)
-
-# ====================================================
-# STEP 1: Define and Store Your Articles (RAG Source)
-# ====================================================
-articles = [
-    {
-        "title": "TerraPeak Official Launch",
-        "content": """March 5, 2025 – Singapore        
-TerraPeak Consulting officially launches, offering expert-led market expansion, sales growth strategies, and practical AI integration to global businesses. Specializing in APAC market entry and growth support for Asian SMEs and family businesses, TerraPeak aims to redefine strategic growth.
-Founded by experienced market and sales strategists, TerraPeak combines exploration with sustainable, strategic growth. With proven expertise, TerraPeak guides companies in harnessing AI to improve sales and operational efficiency.
-Core Offerings:
-- Expert Market Expansion into APAC
-- Revenue-Driven Sales Growth
-- Seamless AI Integration
-- Family Business Growth & Transformation
-Committed to responsible, ethical, and sustainable growth, TerraPeak offers tailored solutions ensuring long-term success and resilience. Businesses seeking expansion, transformation, and innovation are encouraged to reach out via connect@terrapeakgroup.com."""
-    },
-    {
-        "title": "Unlocking Opportunities: A Guide to Doing Business in Asia",
-        "content": """Asia’s markets are diverse, each with distinct cultures, regulations, and consumer preferences. Successful market entry requires careful planning and cultural understanding.
-1. Recognize Diversity: Each Asian market differs significantly. Independent research on consumer preferences, economic conditions, and regulatory landscapes is crucial.
-2. Understand Cultural Nuances: Personal relationships and trust-building are essential. Face-to-face interactions and awareness of local business etiquette enhance partnership opportunities.
-3. Navigate Regulations: Legal frameworks vary widely. Consulting local legal experts helps ensure compliance and protection, particularly for intellectual property rights.
-4. Adapt Products and Services: Localization involves more than translation; products, pricing strategies, and marketing channels should align with local tastes and usage patterns.
-5. Leverage Local Partnerships: Strategic partnerships offer invaluable market insights, reduce entry costs, and minimize risks associated with unfamiliar markets.
-6. Invest in Talent and Training: Hiring skilled local talent and providing basic cross-cultural training ensures smooth operations and effective market penetration.
-7. Stay Agile and Innovative: Regularly reassessing market trends and technological advancements allows businesses to remain competitive and responsive in dynamic Asian markets."""
-    },
-    {
-        "title": "AI & SMEs: 10 Key Stats Revealing Growth, Challenges, and Opportunities",
-        "content": """Artificial Intelligence (AI) is rapidly changing how SMEs and family businesses operate, offering significant productivity gains, enhanced customer engagement, and cost efficiencies. Adoption among SMEs is growing quickly, with many businesses already using AI-powered solutions like chatbots, social media automation, and generative AI.
-SMEs widely recognize AI’s benefits, including improved efficiency, automated marketing, sales forecasting, and better customer service. However, common concerns include knowledge gaps, high initial costs, uncertainty about return on investment (ROI), cybersecurity, and data privacy.
-Practical, user-friendly AI solutions designed specifically for SMEs are making adoption easier. Cloud-based AI services (AI-as-a-Service) and generative AI tools have increased accessibility, allowing SMEs to automate processes, create engaging content, and enhance productivity without large upfront investments.
-To fully leverage AI’s potential, SMEs should:
-- Develop clear AI adoption strategies and roadmaps.
-- Establish measurable KPIs to track AI effectiveness.
-- Use cost-effective AI tools tailored to their specific business needs.
-SMEs strategically adopting AI gain a competitive edge, achieve sustainable growth, and drive long-term efficiency."""
-    },
-    {
-        "title": "SGD Digital Solutions Brochure",
-        "content": """At TerraPeak Group, automation is about working smarter, not harder. Our digital solutions empower businesses to embrace AI and automation without complexity. We offer:
-• AI Chatbots – Automate customer inquiries 24/7, improve lead generation, and boost customer service. Designed for SMEs and family businesses, our bots are platform-native, multilingual, and customizable (p.5-6).
-• Facebook & WhatsApp Bots – Handle FAQs, schedule appointments, track orders, and sync with Google Sheets or CRMs. Includes GDPR compliance, smart triggers, and analytics (p.6-7).
-• AI Social Media Automation – Auto-schedule content, generate captions, and track interactions. Our system improves engagement, visibility, and saves time (p.8-9).
-• AI Task Manager – Automate task assignments and team workflows. Keeps SMEs productive and aligned without admin overload (p.10).
-• AI Ordering Assistant – Smart (re)ordering engine that analyzes past sales to suggest stock quantities, highlight profit-makers, and avoid over/under-stocking (p.11-12).
-• Pricing Plans (Chatbot) – Starter, Growth, and Pro tiers ranging from 500 to unlimited interactions, with add-ons like CRM, training calls, and channel integrations (p.13-15).
-• AI Tool Pricing – Each tool is priced separately (e.g. S$1000 setup + S$250 monthly for the Ordering Assistant) with standalone options available (p.16).
-Contact: connect@terrapeakgroup.com | www.terrapeakgroup.com | +65 8061 9479 (p.17)"""
-    },
-    {
-        "title": "TerraPeak Pricing Plans",
-        "content": """TerraPeak offers transparent, scalable pricing for automation and AI services.
-
-CHATBOT PLANS
-
-Starter
-- One-time setup: S$750–1500
-- Monthly: S$100
-- 500 interactions/month
-- Best for: Micro-businesses or first-time chatbot users
-
-Growth (Recommended)
-- One-time setup: S$750–1500
-- Monthly: S$200
-- 2000 interactions/month
-- Best for: SMEs scaling up with light integration needs
-
-Pro
-- One-time setup: S$1500–3500
-- Monthly: S$400
-- Unlimited interactions
-- Best for: Companies needing full automation and CRM support
-
-OPTIONAL ADD-ONS (Starter and Growth)
-- Facebook / WhatsApp channel: S$75 per month per channel
-- Extra 1000 interactions: S$50 per month
-- One-time training or support call: S$100 per call
-- CRM Integration: Custom quote
-
-AI TOOL PRICING
-
-Article Generation
-- S$5 per article
-
-AI Task Manager
-- S$1000 setup
-- S$20 per user per month
-
-AI Ordering Assistant
-- S$1500 setup
-- S$250 per month
-
-All services include a 30-day money-back guarantee if not satisfied."""
-    }
-]
-
-
-# ============================================================
-# STEP 2: Create an Embedding Function Using a Client Instance
-# ============================================================
-def get_embedding(text, model="text-embedding-3-small"):
-    """
-    Generate a numeric embedding for a given text using OpenAI's new SDK (v1.x).
-    """
-    if not text or not isinstance(text, str) or not text.strip():
-        raise ValueError("Text for embedding must be a non-empty string.")
-
-    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-    response = client.embeddings.create(
-        input=text.strip(),
-        model=model
-    )
-    
-    embedding = response.data[0].embedding
-    return np.array(embedding)
-# ===================================================================
-# STEP 3: Generate Embeddings for the Articles and Build FAISS Index
-# ===================================================================
-# Generate embeddings for each article
-article_embeddings = [
-    get_embedding(article["content"])
-    for article in articles
-    if article.get("content") and isinstance(article["content"], str) and article["content"].strip()
-]
-
-# Determine the dimensionality of the embeddings
-embedding_dim = len(article_embeddings[0])
-
-# Create a FAISS index (using L2 distance)
-index = faiss.IndexFlatL2(embedding_dim)
-
-# Convert embeddings to a NumPy array of type float32
-embeddings_np = np.array(article_embeddings).astype('float32')
-index.add(embeddings_np)
-print("FAISS index created with", index.ntotal, "articles.")
-
-# ====================================================================
-# STEP 4: Create a Function to Retrieve Relevant Articles for a Query
-# ====================================================================
-def retrieve_relevant_articles(query, k=2):
-    """
-    Retrieve the indices and distances of the k most relevant articles for the given query.
-    Includes error handling to avoid crashes on embedding or index issues.
-    """
-    try:
-        # Generate an embedding for the query text
-        query_embedding = get_embedding(query).astype('float32')
-        query_embedding = np.expand_dims(query_embedding, axis=0)  # FAISS requires a 2D array
-
-        # Search the FAISS index for the top-k similar articles
-        distances, indices = index.search(query_embedding, k)
-
-        return indices[0], distances[0]
-
-    except Exception as e:
-        print(f"[Error] Failed to retrieve relevant articles: {e}")
-        return [], []
-
-# ============================================================
-# STEP 5: Build a Prompt that Integrates the Retrieved Context
-# ============================================================
-def build_prompt_with_context(user_query, k=None):
-    """
-    Build a prompt that includes relevant article context based on the user query.
-    Dynamically expands context if certain keywords like 'pricing' are detected.
-    """
-    # Automatically expand context depth if pricing is mentioned
-    lowered = user_query.lower()
-    if k is None:
-        if "pricing" in lowered or "price" in lowered or "cost" in lowered:
-            k = 5  # Increase context range
-        else:
-            k = 2  # Default to 2 for general queries
-
-    indices, _ = retrieve_relevant_articles(user_query, k)
-
-    labeled_contexts = []
-    for i in indices:
-        article = articles[i]
-        trimmed_content = article["content"][:1000]  # Optional trim
-        labeled_context = f"Source: {article['title']}\n{trimmed_content}"
-        labeled_contexts.append(labeled_context)
-
-    full_context = "\n\n".join(labeled_contexts)
-
-    prompt = (
-        f"You are an AI assistant responding to the user's question using the most relevant context below.\n"
-        f"Use the sources to support your answer clearly.\n\n"
-        f"{full_context}\n\n"
-        f"User Question: {user_query}\n\n"
-        f"Answer:"
-    )
-
-    return prompt
+st.markdown(HIDE_STREAMLIT_STYLE, unsafe_allow_html=True)
 
 # ============================
 # Session State Initialization
@@ -366,6 +33,8 @@ def build_prompt_with_context(user_query, k=None):
 # Ensure session_id is initialized for tracking
 if "session_id" not in st.session_state:
     st.session_state.session_id = str(uuid.uuid4())[:8]
+# Namespaced so API callers can never address a UI visitor's conversation
+st.session_state.conversation_id = f"ui:{st.session_state.session_id}"
 
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
@@ -373,204 +42,6 @@ if "chat_history" not in st.session_state:
 if "chat_enabled" not in st.session_state:
     st.session_state.chat_enabled = False  # Set to True to allow input field to appear
 
-# Initialize chat context
-if "chat_context" not in st.session_state:
-    st.session_state.chat_context = [
-        {'role': 'system', 'content': """
-You are Terra, the professional virtual assistant of TerraPeak Consulting—an expert-led business consulting firm specializing in market expansion, sales growth, AI automation, and sustainable business transformation.
-Your personality reflects TerraPeak’s values: clear, confident, helpful, and grounded in real-world expertise. You speak in a friendly and professional tone—always aiming to guide visitors with clarity, empathy, and practical insights. You are knowledgeable, supportive, and solution-oriented.
-**Important:** Always respond in the same language as the user’s question. If the user asks in Dutch (or any other language), reply in that language. If the user switches language mid-conversation, adjust your language accordingly.
-
-🤖 Interaction Rules:
-If someone says “Hi”, “Hello”, “How are you?”, or anything casual—respond warmly and professionally, and offer to help. Example replies:
-“Hi there! 👋 I’m Terra, your virtual assistant here at TerraPeak Consulting. How can I support your business today?”
-“Doing great—thanks for asking! What can I help you with today around market expansion, AI, or sales growth?”
-“Nice to meet you too! I can walk you through our services or connect you with a consultant if needed.”
-
-If someone asks "What does TerraPeak do?":
-“TerraPeak helps businesses grow through expert-led market expansion, revenue-focused sales strategies, and practical AI automation—especially for Western companies entering APAC or Asian SMEs scaling up.”
-
-If a user asks for a live chat:
-- First ask: “I’d be happy to help—could you share your question here first?”
-- If they insist: “No problem—a consultant will get back to you within 1 working day.”
-- If it’s urgent: Provide phone number +6580619479 and email connect@terrapeakgroup.com.
-
-🌍 Core Services (4 Pillars)
-#1 Consulting, Coaching & Training – Market entry, B2B sales growth, leadership development
-#2 Automation Solutions – AI tools (chatbots, social media automation, task managers)
-#3 Trading – For companies entering APAC without an in-house sales network
-#4 Strategic Advisory – Tailored support for SMEs and family businesses
-
-🧭 Company Values
-- Exploration & Growth
-- Sustainability & Responsibility
-- Clarity & Impact
-
-(If asked, expand as follows:)
-Exploration & Growth: Like venturing into nature, we guide businesses into new markets and challenges with vision and flexibility.
-Sustainability & Responsibility: We foster long-term, ethical growth with respect for people, partnerships, and the planet.
-Clarity & Impact: We cut through complexity, offering strategic clarity and results-focused actions.
-
-⚙️ Automation Solutions
-AI Chatbot
-- Automates customer FAQs, improves lead gen, and provides 24/7 engagement.
-- Works across websites, messengers, and social media.
-
-Social Media Automation
-- Auto-schedules content, writes captions, manages engagement.
-
-AI Task Manager
-- Tracks and assigns tasks, sends smart alerts, and identifies process improvements.
-
-Benefits:
-- Increased efficiency & reduced manual work
-- 24/7 availability
-- Cost-effective and scalable
-- Real-time insights
-
-📈 Coaching & Training:
-We empower your teams with the tools and confidence to grow. Programs are practical, hands-on, and tailored to SMEs and family businesses.
-
-Core Focus Areas:
-- Sales Excellence
-- AI Readiness & Change Management
-- Leadership & Strategy Development
-- SME Professionalization
-
-Sample Trainings Offered:
-- Basic Indoor Sales & Customer Service
-- Business Development & Account Management
-- Cold Calling Techniques
-- Personal Coaching (1-on-1)
-- Upscaling Your Business
-- Country Plan Development
-
-🛫 Trading – Your Gateway to APAC:
-- Market Entry Without a Local Sales Team: Turnkey setup for businesses without APAC infrastructure.
-- Sales & Distribution Network: We connect you with buyers, distributors, and partners.
-- Reduced Risk: We handle compliance, local ops, and partner alignment.
-- Scalability: Support for pilot launches or full-scale growth.
-
-📊 TerraPeak’s 3-Phase Consulting Approach:
-Phase 1 – Discovery & Strategy
-- Initial business assessment
-- Market, feasibility, and AI readiness analysis
-- Roadmap creation with clear next steps
-
-Phase 2 – Execution & Guidance
-- Step-by-step execution with our expert advisors
-- Support for market entry, sales process, or AI integration
-
-Phase 3 – Optimization & Long-Term Growth
-- KPI tracking, data-driven refinements
-- Strategy adjustments and scale support
-
-🔑 Why Choose TerraPeak:
-- Proven APAC entry success
-- B2B sales growth expertise
-- Easy, practical AI for non-tech teams
-- SME & family business focus
-- Sustainable, hands-on business support
-- We’re not just consultants—we’re your growth partners
-
-🧭 About TerraPeak:
-Founded by adventurers who thrive in the wild, we bring the same spirit of exploration and focus to business. We help companies navigate complexity with clarity, and guide them toward sustainable growth through sales, AI, and expansion expertise.
-
-📌 FAQ (Short Answers)
-- Industries: We work with manufacturing, trading, B2B services, retail, and e-commerce.
-- Tech Skills Not Required: Our AI tools are designed for ease-of-use.
-- Already in APAC? We help refine, grow, or restructure local efforts.
-- Location: Based in Singapore with local experts across APAC.
-- AI Setup Time: Weeks—not months. Minimal business disruption.
-- Customized Solutions: Every strategy is tailored to your goals.
-
-(Keep responses helpful, natural, and client-centered. Always offer a next step.)
-"""}
-    ]
-
-LIVE_CHAT_KEYWORDS = [
-    "speak", "talk", "call", "consultant", "real person", "human", "live chat", "contact someone"
-]
-
-def detect_intent(user_input: str) -> str:
-    system_msg = (
-        "You are an assistant that classifies the intent of a user's message. "
-        "Return only one of the following: 'handoff', 'general', or 'other'. "
-        "Only return 'handoff' if the user clearly asks to talk to a person, speak to a consultant, or requests a meeting."
-    )
-
-    prompt = f"""
-Message: "{user_input}"
-
-What is the user's intent? 
-Return just one word: handoff, general, or other.
-"""
-
-    try:
-        response = get_completion_from_messages([
-            {"role": "system", "content": system_msg},
-            {"role": "user", "content": prompt}
-        ])
-        result = response.strip().lower()
-        if result not in ["handoff", "general", "other"]:
-            return "general"
-        return result
-
-    except Exception:
-        lowered = user_input.lower()
-
-        # STRICT keyword fallback only when no GPT available
-        live_chat_triggers = [
-            "i want to talk", "can i speak", "talk to someone", "speak to someone",
-            "contact consultant", "want a call", "need a meeting", "book a call",
-            "real person", "human support", "live chat", "contact support"
-        ]
-
-        # Only trigger handoff if it's clearly asking for help
-        if any(trigger in lowered for trigger in live_chat_triggers):
-            return "handoff"
-
-        return "general"
-
-
-
-# ==============================================
-# OpenAI Communication Function (uses Chat API)
-# ==============================================
-def get_completion_from_messages(user_messages, model="gpt-3.5-turbo-0125", temperature=0, max_history=6):
-    try:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            return "API key is missing. Please check your environment settings."
-
-        client = openai.OpenAI(api_key=api_key)
-
-        # Retain the system prompt and only the last few interactions to reduce token bloat
-        preserved_context = [m for m in st.session_state.chat_context if m["role"] == "system"]
-        recent_history = st.session_state.chat_context[-max_history:]
-        messages = preserved_context + recent_history + user_messages
-
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            timeout=15  # Set a timeout (in seconds) to avoid long hangs
-        )
-
-        return response.choices[0].message.content
-
-    except RateLimitError:
-        logging.warning("Rate limit reached. Try again shortly.")
-        return "We're handling a high volume of requests right now. Please try again in a moment."
-
-    except OpenAIError as e:
-        logging.error(f"OpenAI API error: {e}")
-        return "Hmm, something went wrong while reaching our assistant. Please try again shortly."
-
-    except Exception as e:
-        logging.exception("Unexpected error occurred.")
-        return "Oops, an unexpected error occurred. Please try again or contact support."
-
 if not st.session_state.get("chat_enabled", False):
     with st.form("user_info_form"):
         st.markdown('<div class="contact-header"><strong>Enter your contact details before chatting with our AI assistant:</strong></div>', unsafe_allow_html=True)
@@ -580,8 +51,7 @@ if not st.session_state.get("chat_enabled", False):
         email = st.text_input("Enter your email:", key="email_input")
         company = st.text_input("Enter your company name:", key="company_input")
         phone = st.text_input("Enter your phone number:", key="phone_input")
-        country_list = sorted([country.name for country in pycountry.countries])
-        country = st.selectbox("Select Country", country_list, key="country_dropdown")
+        country = st.selectbox("Select Country", country_names(), key="country_dropdown")
 
         st.markdown('</div>', unsafe_allow_html=True)
 
@@ -628,21 +98,52 @@ if not st.session_state.get("chat_enabled", False):
 # ========================================================
 # CUSTOM UI: Display Chat History with Styled Chat Bubbles
 # =========================================================
-st.markdown("---")
-st.markdown("**💬 Chat with the Terrapeak Automated Consultant:**")
-
-if st.session_state.chat_enabled:
-    for msg in st.session_state.chat_history:
+# Only the newest CHAT_LIVE_MESSAGES (up to one page more) are rendered as chat
+# bubbles. Older messages move into the "Earlier messages" pager in whole pages
+# of CHAT_PAGE_SIZE; each page is rendered to markdown once and kept in the
+# session, so a rerun costs the same however long the conversation is.
+CHAT_LIVE_MESSAGES = int(os.getenv("CHAT_LIVE_MESSAGES", "20"))
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "20"))
+
+def render_archived_page(messages):
+    lines = []
+    for msg in messages:
+        speaker = "You" if msg["role"] == "user" else "Terra"
+        lines.append(f"**{speaker}:** {msg['content']}")
+    return "\n\n---\n\n".join(lines)
+
+def archive_old_messages():
+    """
+    Pre-render full pages that fell out of the live window; returns the index
+    of the first live message.
+    """
+    archive = st.session_state.setdefault("chat_archive", [])
+    history = st.session_state.chat_history
+    while len(history) - len(archive) * CHAT_PAGE_SIZE >= CHAT_LIVE_MESSAGES + CHAT_PAGE_SIZE:
+        start = len(archive) * CHAT_PAGE_SIZE
+        archive.append(render_archived_page(history[start:start + CHAT_PAGE_SIZE]))
+    return len(archive) * CHAT_PAGE_SIZE
+
+def show_chat_history():
+    first_live = archive_old_messages()
+    archive = st.session_state.chat_archive
+    if archive:
+        with st.expander(f"Earlier messages ({first_live})"):
+            page = 1
+            if len(archive) > 1:
+                page = st.number_input("Page (1 = oldest)", 1, len(archive), len(archive), key="chat_archive_page")
+            st.markdown(archive[page - 1])
+
+    for msg in st.session_state.chat_history[first_live:]:
         with st.chat_message(msg["role"], avatar="👤" if msg["role"] == "user" else "🌍"):
             st.markdown(msg["content"])
-            
+
 # ============================================
 # CUSTOM UI: Chat Input Field with Send Button
 # ============================================
-if st.session_state.chat_enabled:
-    user_input = st.chat_input("Type your message here...")
-
-    if user_input:
+def handle_user_message(user_input):
+    # Stage timings and token usage of this turn are grouped for metrics
+    with turn_span(st.session_state.session_id):
         with st.chat_message("user", avatar="👤"):
             st.markdown(user_input)
 
@@ -656,34 +157,23 @@ if st.session_state.chat_enabled:
             m for m in st.session_state.chat_history if m["role"] == "user"
         ])
 
-        # 🔍 INTENT DETECTION with GPT + fallback
-        intent = detect_intent(user_input)
+        # 🔍 INTENT DETECTION (local classifier, GPT only if unsure), with the
+        # article retrieval for the answer running at the same time
+        intent, retrieved = classify_and_retrieve(
+            user_input.strip(),
+            detect_intent,
+            lambda query: retrieve_relevant_articles(query, k=2)
+        )
         print("Detected intent:", intent)  # Optional debug
 
         if intent == "handoff":
             user_name = st.session_state.get("name", "there").strip().split(" ")[0].capitalize()
 
-            styled_cta = f"""<div style='
-                background-color: #2f5d50;
-                color: #ffffff;
-                padding: 14px;
-                border-radius: 12px;
-                text-align: center;
-                width: fit-content;
-                font-weight: bold;
-                font-family: sans-serif;
-                margin-top: 10px;
-            '>
-            📅 <a href="https://calendly.com/terrapeakgroup/terrapeak_group_call" target="_blank" style='color: white; text-decoration: none;'>
-                Book a 30-Minute Call with TerraPeak
-            </a>
-            </div>"""
-
             assistant_response = f"Absolutely, {user_name} I can connect you with one of our consultants:"
 
             with st.chat_message("assistant", avatar="🌍"):
                 st.markdown(f"Absolutely, {user_name} 👋 I can connect you with one of our consultants:", unsafe_allow_html=True)
-                st.markdown(styled_cta, unsafe_allow_html=True)
+                st.markdown(CTA_HTML, unsafe_allow_html=True)
 
                 # ✅ LOG that CTA was triggered
                 log_to_google_sheets({
@@ -700,18 +190,19 @@ if st.session_state.chat_enabled:
                     "session_id": st.session_state.session_id
                  })
    
+            remember_turn(st.session_state.conversation_id, user_input.strip(), assistant_response)
 
-            st.stop()  # ✅ Skip GPT if it's a handoff
+            return  # ✅ Skip GPT if it's a handoff
 
         # === GPT ASSISTANT RESPONSE ===
-        rag_prompt = build_prompt_with_context(user_input.strip(), k=2)
-        assistant_response = get_completion_from_messages([{
-            "role": "user",
-            "content": rag_prompt
-        }])
-
+        # Earlier turns come from the server-side store (shared with the API)
+        history = conversation_history(st.session_state.conversation_id)
         with st.chat_message("assistant", avatar="🌍"):
-            st.markdown(assistant_response)
+            # Render tokens as they arrive; write_stream returns the full text
+            assistant_response = st.write_stream(stream_answer_with_context(
+                user_input.strip(), k=2, retrieved=retrieved, history=history, intent=intent
+            ))
+        remember_turn(st.session_state.conversation_id, user_input.strip(), assistant_response)
 
         st.session_state.chat_history.append({
             "role": "assistant",
@@ -722,26 +213,10 @@ if st.session_state.chat_enabled:
         user_name = st.session_state.get("name", "there").strip().split(" ")[0].capitalize()
         recent_user_messages = [m["content"].lower() for m in st.session_state.chat_history if m["role"] == "user"]
 
-        styled_cta = f"""<div style='
-            background-color: #2f5d50;
-            color: #ffffff;
-            padding: 14px;
-            border-radius: 12px;
-            text-align: center;
-            width: fit-content;
-            font-weight: bold;
-            font-family: sans-serif;
-            margin-top: 10px;
-        '>
-        📅 <a href="https://calendly.com/terrapeakgroup/terrapeak_group_call" target="_blank" style='color: white; text-decoration: none;'>
-            Book a 30-Minute Call with TerraPeak
-        </a>
-        </div>"""
-
         if len(recent_user_messages) >= 6 and "consultant_offer_shown" not in st.session_state:
             with st.chat_message("assistant", avatar="🌍"):
                 st.markdown(f"{user_name}, if you'd prefer to speak directly with a TerraPeak consultant, feel free to book a time below:", unsafe_allow_html=True)
-                st.markdown(styled_cta, unsafe_allow_html=True)
+                st.markdown(CTA_HTML, unsafe_allow_html=True)
             st.session_state.consultant_offer_shown = True
 
         # ✅ Log to Google Sheets
@@ -759,25 +234,27 @@ if st.session_state.chat_enabled:
                 "session_id": st.session_state.session_id
             })
 
-# ==============================================
-# Flask API endpoint for FB → Chatbot forwarding
-# ==============================================
-api = Flask(__name__)
-
-@api.route("/endpoint", methods=["POST"])
-def chatbot_endpoint():
-    payload = request.get_json(silent=True) or {}
-    user_message = payload.get("message", "")
-    if not user_message:
-        return jsonify({"error": "No message provided"}), 400
+@st.fragment
+def chat_area():
+    # Reruns on its own when a message is sent: the header, CSS and contact form
+    # above are not re-executed for chat turns. Inside a fragment chat_input is
+    # drawn inline rather than pinned to the page bottom, so the conversation
+    # (including the new turn) goes in a container placed above it.
+    conversation = st.container()
+    with conversation:
+        show_chat_history()
+    user_input = st.chat_input("Type your message here...")
+    if user_input:
+        with conversation:
+            handle_user_message(user_input)
 
-    # Build RAG prompt + get GPT response
-    rag = build_prompt_with_context(user_message, k=2)
-    reply = get_completion_from_messages([{"role": "user", "content": rag}])
+st.markdown("---")
+st.markdown("**💬 Chat with the Terrapeak Automated Consultant:**")
 
-    return jsonify({"reply": reply})
+if st.session_state.chat_enabled:
+    chat_area()
 
 if __name__ == "__main__":
     # When you run `python main.py`, Streamlit will take over.
-    # To run the Flask API, use gunicorn: `gunicorn main:api`
+    # To run the Flask API, use gunicorn: `gunicorn api:api`
     pass
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================================================
+# In-process metrics (Prometheus text format) and turn timing
+# ==========================================================
+# stage_seconds{stage=...}        histogram of time spent per pipeline stage
+# openai_tokens_total{model,kind} prompt / completion / cached token counts
+#                                 (prompt cache hit rate = cached / prompt)
+# *_total counters                intent sources, cache hits, etc.
+# Collectors registered with register_collector() are read at scrape time
+# (used for cache hit/miss counters that already live on the cache objects).
+# Set METRICS_LOG_TURNS=1 to also log one JSON line per chat turn.
+# The registry is per process: the Flask API serves it on /metrics, and the
+# Streamlit UI serves it on METRICS_PORT (if set) via start_metrics_server().
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LOG_TURNS = os.getenv("METRICS_LOG_TURNS", "").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+_histograms = {}   # (name, labels) -> [bucket_counts, sum, count]
+_counters = {}     # (name, labels) -> value
+_help = {}
+_collectors = []
+
+# Per-turn stage timings, shared with worker threads via copied contexts
+_current_turn = contextvars.ContextVar("current_turn", default=None)
+
+
+def _labels_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    escaped = [
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in items
+    ]
+    return "{" + ",".join(escaped) + "}"
+
+
+def observe(name, value, labels=None, help_text=""):
+    key = (name, _labels_key(labels))
+    with _lock:
+        _help.setdefault(name, ("histogram", help_text))
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * len(DEFAULT_BUCKETS), 0.0, 0]
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+
+def inc(name, amount=1, labels=None, help_text=""):
+    key = (name, _labels_key(labels))
+    with _lock:
+        _help.setdefault(name, ("counter", help_text))
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def register_collector(fn):
+    """
+    fn() returns [(name, type, labels_dict, value)] and is called on every scrape.
+    """
+    _collectors.append(fn)
+
+
+def register_cache(name, cache):
+    """
+    Export a cache's stats() (hits, misses, size) as metrics labelled cache=name.
+    """
+    def collect():
+        stats = cache.stats()
+        return [
+            ("cache_hits_total", "counter", {"cache": name}, stats["hits"]),
+            ("cache_misses_total", "counter", {"cache": name}, stats["misses"]),
+            ("cache_entries", "gauge", {"cache": name}, stats["size"]),
+        ]
+    register_collector(collect)
+
+
+def record_stage(stage, seconds):
+    observe("stage_seconds", seconds, {"stage": stage}, "Time spent per chat pipeline stage")
+    turn = _current_turn.get()
+    if turn is not None:
+        turn["stages"][stage] = turn["stages"].get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage):
+    """
+    Time a block as one pipeline stage.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def record_usage(usage, model):
+    """
+    Count tokens from an OpenAI `response.usage` object (None is ignored).
+    """
+    if usage is None:
+        return
+    help_text = "OpenAI tokens by model and kind"
+    inc("openai_tokens_total", getattr(usage, "prompt_tokens", 0) or 0, {"model": model, "kind": "prompt"}, help_text)
+    inc("openai_tokens_total", getattr(usage, "completion_tokens", 0) or 0, {"model": model, "kind": "completion"}, help_text)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+    inc("openai_tokens_total", cached or 0, {"model": model, "kind": "cached"}, help_text)
+
+    turn = _current_turn.get()
+    if turn is not None:
+        turn["tokens"] = turn.get("tokens", 0) + (getattr(usage, "total_tokens", 0) or 0)
+        turn["cached_tokens"] = turn.get("cached_tokens", 0) + (cached or 0)
+
+
+@contextmanager
+def turn_span(session_id, **fields):
+    """
+    Group stage timings of one chat turn; logged as JSON when METRICS_LOG_TURNS is set.
+    """
+    turn = {"session_id": session_id, "stages": {}, **fields}
+    token = _current_turn.set(turn)
+    started = time.perf_counter()
+    try:
+        yield turn
+    finally:
+        _current_turn.reset(token)
+        total = time.perf_counter() - started
+        record_stage("turn", total)
+        if LOG_TURNS:
+            turn["total_seconds"] = round(total, 4)
+            turn["stages"] = {stage: round(seconds, 4) for stage, seconds in turn["stages"].items()}
+            print("[Turn]", json.dumps(turn, default=str))
+
+
+def copy_context():
+    """
+    Context to run background work in so its stages count toward the current turn.
+    """
+    return contextvars.copy_context()
+
+
+def render_prometheus():
+    """
+    Return all metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    with _lock:
+        histograms = {key: (list(entry[0]), entry[1], entry[2]) for key, entry in _histograms.items()}
+        counters = dict(_counters)
+        help_items = dict(_help)
+
+    written = set()
+
+    def header(name, metric_type, help_text=""):
+        if name not in written:
+            written.add(name)
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+    for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+        header(name, "histogram", help_items.get(name, ("", ""))[1])
+        for bound, bucket_count in zip(DEFAULT_BUCKETS, buckets):
+            lines.append(f"{name}_bucket{_format_labels(labels, {'le': bound})} {bucket_count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, {'le': '+Inf'})} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter", help_items.get(name, ("", ""))[1])
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    collected = []
+    for collector in list(_collectors):
+        try:
+            collected.extend(collector())
+        except Exception as e:
+            lines.append(f"# collector error: {e}")
+    # Samples of one metric must be contiguous, even across collectors
+    for name, metric_type, labels, value in sorted(collected, key=lambda sample: sample[0]):
+        header(name, metric_type)
+        lines.append(f"{name}{_format_labels(_labels_key(labels))} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host=None):
+    """
+    Serve render_prometheus() on a background thread (once per process).
+    Uses METRICS_PORT / METRICS_HOST when not given; does nothing without a port.
+    """
+    global _metrics_server
+    port = port or os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            try:
+                server = ThreadingHTTPServer((host or os.getenv("METRICS_HOST", "0.0.0.0"), int(port)), _MetricsHandler)
+            except (OSError, ValueError) as e:
+                print(f"[Metrics] Could not serve metrics on port {port}: {e}")
+                return None
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+            _metrics_server = server
+        return _metrics_server
@@ -0,0 +1,216 @@
+import os
+import re
+import time
+import threading
+from collections import deque, namedtuple
+from metrics import inc, register_collector
+from prompt_budget import count_tokens
+from openai_client import env_number
+
+# ==========================================================
+# Cost- and latency-aware model routing for chat answers
+# ==========================================================
+# Each RAG answer gets a model tier from cheap local signals:
+#   - query length (tokens) and number of questions asked
+#   - topic words that usually need multi-step reasoning (market entry,
+#     regulation, comparisons, roadmaps, ...)
+#   - retrieval distance: a weak best match means the answer has to reason
+#     beyond a single passage
+#   - intent (off-topic "other" messages always go to the fast tier) and history
+# A score >= ROUTER_STRONG_THRESHOLD selects the strong tier, unless it is over
+# budget: its recent latency (moving average) is above
+# ROUTER_STRONG_LATENCY_BUDGET seconds, or its estimated spend over the last
+# hour is above ROUTER_STRONG_HOURLY_BUDGET (USD). A latency average older than
+# LATENCY_STALE_SECONDS is ignored, so one slow spell does not block a tier
+# forever. Fast-tier answers that look unsure can be escalated once to the
+# strong tier (non-streaming path only; streamed text cannot be taken back).
+# ROUTER_ENABLED=0 sends everything to the fast tier.
+
+LATENCY_STALE_SECONDS = 300
+
+RouteDecision = namedtuple("RouteDecision", ["tier", "model", "score", "reason"])
+
+# USD per 1M tokens (input, output); unknown models count as free
+MODEL_PRICES = {
+    "gpt-3.5-turbo-0125": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+COMPLEX_TOPICS = re.compile(
+    r"\b(market entry|enter(ing)? (the )?\w+ market|expan\w*|strateg\w*|regulat\w*|complian\w*|"
+    r"distribut\w*|locali[sz]\w*|compar\w*|versus|vs\.?|roadmap|feasibility|roi|"
+    r"business plan|country plan|partner\w*|tax\w*|legal|risk\w*|step[- ]by[- ]step)\b",
+    re.IGNORECASE,
+)
+
+LOW_CONFIDENCE = re.compile(
+    r"\b(i'?m not sure|i am not sure|i don'?t (know|have)|i do not (know|have)|"
+    r"no (specific )?information|cannot (find|provide)|unable to)\b",
+    re.IGNORECASE,
+)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def complexity_score(query, distances=None, intent=None, has_history=False, distance_threshold=0.6):
+    """
+    Return (score, reasons) for a query; higher means it needs a stronger model.
+    """
+    if intent == "other":
+        return 0.0, ["off_topic"]
+
+    score, reasons = 0.0, []
+    tokens = count_tokens(query)
+    if tokens > 40:
+        score += 1.0
+        reasons.append("long_query")
+    if tokens > 120:
+        score += 1.0
+
+    topics = {match.group(0).lower() for match in COMPLEX_TOPICS.finditer(query)}
+    if topics:
+        score += min(len(topics), 3)
+        reasons.append("complex_topic")
+
+    if query.count("?") > 1:
+        score += 0.5
+        reasons.append("multi_question")
+
+    finite = [float(d) for d in (distances if distances is not None else []) if d != float("inf")]
+    if finite and min(finite) > distance_threshold:
+        score += 0.5
+        reasons.append("weak_retrieval")
+
+    if has_history:
+        score += 0.5
+        reasons.append("follow_up")
+
+    return score, reasons or ["simple"]
+
+
+class ModelRouter:
+    """
+    Picks the fast or strong model per request and tracks per-model latency and spend.
+    """
+
+    def __init__(self, fast_model, strong_model, threshold=2.0, latency_budget=10.0,
+                 hourly_budget=2.0, distance_threshold=0.6, enabled=True):
+        self.tiers = {"fast": fast_model, "strong": strong_model}
+        self.threshold = threshold
+        self.latency_budget = latency_budget
+        self.hourly_budget = hourly_budget
+        self.distance_threshold = distance_threshold
+        self.enabled = enabled
+        self._latency = {}      # model -> (moving average of completion seconds, updated_at)
+        self._spend = {}        # model -> deque[(timestamp, usd)]
+        self._lock = threading.Lock()
+
+    @property
+    def fast_model(self):
+        return self.tiers["fast"]
+
+    def hourly_spend(self, model):
+        cutoff = time.time() - 3600
+        with self._lock:
+            window = self._spend.get(model)
+            if not window:
+                return 0.0
+            while window and window[0][0] < cutoff:
+                window.popleft()
+            return sum(usd for _, usd in window)
+
+    def over_budget(self, tier):
+        """
+        Return the budget reason if `tier` should not be used right now, else None.
+        """
+        model = self.tiers[tier]
+        if tier == "fast":
+            return None  # the floor: always available
+        latency, updated_at = self._latency.get(model, (None, 0.0))
+        fresh = time.monotonic() - updated_at < LATENCY_STALE_SECONDS
+        if self.latency_budget and latency is not None and fresh and latency > self.latency_budget:
+            return "latency_budget"
+        if self.hourly_budget and self.hourly_spend(model) >= self.hourly_budget:
+            return "cost_budget"
+        return None
+
+    def _decide(self, tier, score, reason):
+        inc("model_routes_total", labels={"tier": tier, "reason": reason}, help_text="Chat answers routed per model tier")
+        return RouteDecision(tier, self.tiers[tier], score, reason)
+
+    def route(self, query, distances=None, intent=None, has_history=False):
+        if not self.enabled:
+            return self._decide("fast", 0.0, "disabled")
+        score, reasons = complexity_score(query, distances, intent, has_history, self.distance_threshold)
+        if score < self.threshold:
+            return self._decide("fast", score, reasons[0])
+        blocked = self.over_budget("strong")
+        if blocked:
+            return self._decide("fast", score, blocked)
+        return self._decide("strong", score, reasons[0])
+
+    def escalation(self, decision, query, answer):
+        """
+        Return a strong-tier decision if a fast-tier answer looks unsure, else None.
+        """
+        if not self.enabled or decision.tier != "fast" or decision.reason == "off_topic":
+            return None
+        unsure = bool(LOW_CONFIDENCE.search(answer or "")) or (
+            count_tokens(query) > 20 and len((answer or "").strip()) < 40
+        )
+        if not unsure or self.over_budget("strong"):
+            return None
+        inc("model_escalations_total", help_text="Fast-tier answers re-asked on the strong tier")
+        return RouteDecision("strong", self.tiers["strong"], decision.score, "low_confidence")
+
+    def record(self, model, seconds, usage=None):
+        """
+        Feed back a finished completion (latency and, when known, token usage).
+        """
+        with self._lock:
+            previous = self._latency.get(model, (None, 0.0))[0]
+            average = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+            self._latency[model] = (average, time.monotonic())
+            if usage is not None:
+                cost = estimate_cost(
+                    model, getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+                )
+                self._spend.setdefault(model, deque()).append((time.time(), cost))
+                inc("openai_cost_usd_total", cost, {"model": model}, "Estimated OpenAI spend (USD)")
+
+    def collect(self):
+        samples = []
+        for tier, model in self.tiers.items():
+            latency = self._latency.get(model, (None, 0.0))[0]
+            if latency is not None:
+                samples.append(("model_latency_seconds_avg", "gauge", {"tier": tier, "model": model}, latency))
+            samples.append(("model_hourly_spend_usd", "gauge", {"tier": tier, "model": model}, self.hourly_spend(model)))
+        return samples
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router(default_model):
+    """
+    Return the process-wide router; the fast tier defaults to `default_model`.
+    """
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter(
+                fast_model=os.getenv("ROUTER_FAST_MODEL", default_model),
+                strong_model=os.getenv("ROUTER_STRONG_MODEL", "gpt-4o"),
+                threshold=env_number("ROUTER_STRONG_THRESHOLD", 2.0),
+                latency_budget=env_number("ROUTER_STRONG_LATENCY_BUDGET", 10.0),
+                hourly_budget=env_number("ROUTER_STRONG_HOURLY_BUDGET", 2.0),
+                distance_threshold=env_number("ROUTER_DISTANCE_THRESHOLD", 0.6),
+                enabled=os.getenv("ROUTER_ENABLED", "1").lower() not in ("0", "false", "no"),
+            )
+            register_collector(_router.collect)
+        return _router
@@ -0,0 +1,68 @@
+import os
+import threading
+import httpx
+import openai
+
+# ==========================================================
+# Shared OpenAI client (one connection pool per process)
+# ==========================================================
+# Creating openai.OpenAI() per call throws away the TLS session and the HTTP
+# connection pool. Every call site uses get_openai_client() instead, which keeps
+# a single keep-alive pool configured from the environment:
+#   OPENAI_MAX_CONNECTIONS      total connections in the pool         (default 20)
+#   OPENAI_MAX_KEEPALIVE        idle connections kept open             (default 10)
+#   OPENAI_KEEPALIVE_EXPIRY     seconds an idle connection is kept     (default 60)
+#   OPENAI_CONNECT_TIMEOUT      seconds to establish a connection      (default 5)
+#   OPENAI_READ_TIMEOUT         seconds to wait for a response         (default 30)
+#   OPENAI_MAX_RETRIES          SDK retries on connection errors/429/5xx (default 0;
+#                               retries are done by resilience.py instead)
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+
+def env_number(name, default, cast=float):
+    """
+    Read a numeric setting from the environment, falling back to `default` if unset or invalid.
+    """
+    try:
+        return cast(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _build_client(api_key):
+    read_timeout = env_number("OPENAI_READ_TIMEOUT", 30.0)
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=env_number("OPENAI_MAX_CONNECTIONS", 20, int),
+            max_keepalive_connections=env_number("OPENAI_MAX_KEEPALIVE", 10, int),
+            keepalive_expiry=env_number("OPENAI_KEEPALIVE_EXPIRY", 60.0),
+        ),
+        timeout=httpx.Timeout(read_timeout, connect=env_number("OPENAI_CONNECT_TIMEOUT", 5.0)),
+    )
+    return openai.OpenAI(
+        api_key=api_key,
+        http_client=http_client,
+        max_retries=env_number("OPENAI_MAX_RETRIES", 0, int),
+        timeout=read_timeout,
+    )
+
+
+def get_openai_client():
+    """
+    Return the process-wide OpenAI client, creating it on first use.
+    The client is rebuilt only if OPENAI_API_KEY changes.
+    """
+    global _client, _client_key
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if _client is not None and _client_key == api_key:
+        return _client
+
+    with _client_lock:
+        if _client is None or _client_key != api_key:
+            _client = _build_client(api_key)
+            _client_key = api_key
+        return _client
@@ -0,0 +1,92 @@
+import os
+from functools import lru_cache
+
+# ==========================================================
+# Token counting and budgeted prompt assembly
+# ==========================================================
+# The prompt is filled in priority order within PROMPT_TOKEN_BUDGET:
+#   1. system prompt and the current user message (always kept)
+#   2. retrieved passages, best-ranked first (at most CONTEXT_TOKEN_BUDGET)
+#   3. recent conversation turns, newest first, with whatever is left
+# Counts use tiktoken when it is installed and fall back to an estimate.
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"[Tokens] tiktoken unavailable, estimating token counts: {e}")
+    return _encoding
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text):
+    """
+    Token count for a string; memoized so repeated messages are counted once.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(len(text) // 4 + 1, len(text.split()))
+
+
+def message_tokens(message):
+    return MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "")
+
+
+def messages_tokens(messages):
+    return sum(message_tokens(message) for message in messages)
+
+
+def select_within_budget(texts, budget):
+    """
+    Keep ranked texts, best first, skipping any that would overflow the budget.
+    """
+    selected = []
+    used = 0
+    for text in texts:
+        cost = count_tokens(text)
+        if used + cost <= budget:
+            selected.append(text)
+            used += cost
+    return selected
+
+
+def fit_history(history, budget):
+    """
+    Return the longest run of most recent messages that fits in the budget.
+    """
+    kept = []
+    used = 0
+    for message in reversed(history):
+        cost = message_tokens(message)
+        if used + cost > budget:
+            break
+        kept.append(message)
+        used += cost
+    return list(reversed(kept))
+
+
+def assemble_messages(system_messages, history, user_messages, budget=None):
+    """
+    Build the final message list: system prompt, then as much recent history as
+    fits the remaining budget, then the current user message(s).
+    """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    remaining = budget - messages_tokens(system_messages) - messages_tokens(user_messages)
+    return system_messages + fit_history(history, max(0, remaining)) + user_messages
@@ -0,0 +1,226 @@
+import os
+import time
+import random
+import threading
+import email.utils
+import openai
+from metrics import inc, register_collector
+from openai_client import env_number
+
+# ==========================================================
+# Retries, circuit breakers and fallbacks for OpenAI calls
+# ==========================================================
+# call_openai(endpoint, fn) runs fn(timeout) with:
+#   - retries on rate limits, timeouts, connection errors and 5xx, using full
+#     jitter exponential backoff (OPENAI_RETRY_BASE_DELAY .. OPENAI_RETRY_MAX_DELAY)
+#     or the server's Retry-After, up to OPENAI_RETRY_ATTEMPTS attempts
+#   - an overall deadline (OPENAI_CALL_DEADLINE seconds): no retry is started
+#     that could not finish in time, and each attempt's timeout is capped by it
+#   - one circuit breaker per endpoint: after CIRCUIT_FAILURE_THRESHOLD failed
+#     attempts in a row it opens and calls fail immediately for
+#     CIRCUIT_RESET_TIMEOUT seconds, then one trial call is let through
+# call_with_fallback() walks an ordered list of models (CHAT_FALLBACK_MODELS)
+# within one deadline, split evenly between the models still to try but giving
+# each at least one full attempt timeout first. Client errors (bad request,
+# auth) are raised at once.
+#
+# Metrics: openai_retries_total{endpoint,reason}, openai_fallbacks_total{endpoint,to},
+# circuit_breaker_rejections_total{endpoint}, circuit_breaker_open{endpoint}.
+
+
+RETRY_ATTEMPTS = max(1, env_number("OPENAI_RETRY_ATTEMPTS", 3, int))
+RETRY_BASE_DELAY = env_number("OPENAI_RETRY_BASE_DELAY", 0.5)
+RETRY_MAX_DELAY = env_number("OPENAI_RETRY_MAX_DELAY", 8.0)
+CALL_DEADLINE = env_number("OPENAI_CALL_DEADLINE", 20.0)
+CIRCUIT_FAILURE_THRESHOLD = max(1, env_number("CIRCUIT_FAILURE_THRESHOLD", 5, int))
+CIRCUIT_RESET_TIMEOUT = env_number("CIRCUIT_RESET_TIMEOUT", 30.0)
+
+
+class CircuitOpenError(openai.OpenAIError):
+    """
+    Raised without calling upstream while an endpoint's circuit breaker is open.
+    """
+
+
+def is_retryable(error):
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, CircuitOpenError)):
+        return True  # APITimeoutError is an APIConnectionError
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def retry_after_seconds(error):
+    """
+    Seconds the server asked us to wait (Retry-After / retry-after-ms headers), or None.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, error=None):
+    """
+    Full-jitter exponential backoff, or the server's Retry-After when it sent one.
+    """
+    retry_after = retry_after_seconds(error) if error is not None else None
+    if retry_after is not None:
+        return retry_after + random.uniform(0, RETRY_BASE_DELAY)
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker (closed -> open -> half-open -> closed).
+    """
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True  # half-open: let one call test upstream
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or (self.opened_at is None and self.failures >= self.failure_threshold):
+                if self.opened_at is None:
+                    print(f"[Circuit Breaker] {self.name} open after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release(self):
+        # The trial call ended without telling us anything about upstream health
+        with self._lock:
+            self._trial_running = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint):
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+        return breaker
+
+
+def _collect_breakers():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [("circuit_breaker_open", "gauge", {"endpoint": b.name}, int(b.is_open)) for b in breakers]
+
+
+register_collector(_collect_breakers)
+
+
+def call_openai(endpoint, fn, timeout=15.0, deadline=None, attempts=None):
+    """
+    Return fn(timeout) with retries and the endpoint's circuit breaker.
+    `deadline` is a time.monotonic() value shared by retries (and fallbacks).
+    """
+    breaker = get_breaker(endpoint)
+    deadline = deadline if deadline is not None else time.monotonic() + CALL_DEADLINE
+    attempts = attempts or RETRY_ATTEMPTS
+
+    for attempt in range(attempts):
+        if not breaker.allow():
+            inc("circuit_breaker_rejections_total", labels={"endpoint": endpoint},
+                help_text="Calls failed fast because the circuit breaker was open")
+            raise CircuitOpenError(f"Circuit open for {endpoint}")
+
+        remaining = deadline - time.monotonic()
+        try:
+            result = fn(max(0.1, min(timeout, remaining)))
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.release()
+                raise
+            breaker.record_failure()
+            delay = backoff_delay(attempt, e)
+            if attempt + 1 >= attempts or time.monotonic() + delay >= deadline:
+                raise
+            reason = "rate_limit" if isinstance(e, openai.RateLimitError) else type(e).__name__
+            inc("openai_retries_total", labels={"endpoint": endpoint, "reason": reason},
+                help_text="Retried OpenAI calls")
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+def fallback_models(model):
+    """
+    The ordered model chain for `model`: itself, then CHAT_FALLBACK_MODELS.
+    """
+    chain = [model]
+    for name in os.getenv("CHAT_FALLBACK_MODELS", "gpt-4o-mini").split(","):
+        name = name.strip()
+        if name and name not in chain:
+            chain.append(name)
+    return chain
+
+
+def call_with_fallback(endpoint, models, fn, timeout=15.0):
+    """
+    Try fn(model, timeout) for each model in order until one succeeds.
+    Returns (result, model). Upstream failures move on to the next model; the
+    last error is raised if every model fails. Each model gets an equal share of
+    what is left of the deadline, so a hanging primary cannot starve its fallbacks,
+    but never less than one full `timeout` attempt (while the deadline allows).
+    """
+    deadline = time.monotonic() + CALL_DEADLINE
+    last_error = None
+    for position, model in enumerate(models):
+        remaining = deadline - time.monotonic()
+        if position and remaining <= 0:
+            break
+        if position:
+            inc("openai_fallbacks_total", labels={"endpoint": endpoint, "to": model},
+                help_text="Calls answered by a fallback model or cached answer")
+        share = max(remaining / (len(models) - position), min(timeout, remaining))
+        model_deadline = time.monotonic() + share
+        try:
+            result = call_openai(f"{endpoint}:{model}", lambda t: fn(model, t), timeout=timeout, deadline=model_deadline)
+            return result, model
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            last_error = e
+    raise last_error
@@ -0,0 +1,126 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from metrics import register_cache
+
+# ==========================================
+# Semantic answer cache for the RAG path
+# ==========================================
+# An answer is reused when a new query (a) retrieved the same set of articles
+# for the same model, and (b) has an embedding within `threshold` cosine
+# similarity of a query we already answered. Entries are dropped when the
+# article corpus changes (different fingerprint).
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype="float32")
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticResponseCache:
+    """
+    Size-bounded, thread-safe cache of RAG answers looked up by query similarity.
+    """
+
+    def __init__(self, threshold=0.95, maxsize=512, ttl=None):
+        self.threshold = threshold
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self._fingerprint = None
+        self._entries = OrderedDict()  # entry_id -> (group, vector, answer, expires_at)
+        self._groups = {}              # group -> set(entry_id)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_fingerprint(self, fingerprint):
+        # Caller holds the lock
+        if fingerprint != self._fingerprint:
+            self._entries.clear()
+            self._groups.clear()
+            self._fingerprint = fingerprint
+
+    def _remove(self, entry_id):
+        group = self._entries.pop(entry_id)[0]
+        members = self._groups.get(group)
+        if members is not None:
+            members.discard(entry_id)
+            if not members:
+                del self._groups[group]
+
+    def get(self, query_embedding, article_ids, model, fingerprint, threshold=None):
+        """
+        Return a cached answer for a similar query with the same retrieved
+        articles, or None. `threshold` overrides the configured similarity.
+        """
+        group = (model, tuple(sorted(int(i) for i in article_ids)))
+        query_vector = _unit(query_embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+
+            best_id, best_score = None, self.threshold if threshold is None else threshold
+            for entry_id in list(self._groups.get(group, ())):
+                _, vector, _, expires_at = self._entries[entry_id]
+                if expires_at is not None and expires_at <= now:
+                    self._remove(entry_id)
+                    continue
+                score = float(np.dot(vector, query_vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2]
+
+    def set(self, query_embedding, article_ids, model, fingerprint, answer):
+        group = (model, tuple(sorted(int(i) for i in article_ids)))
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (group, _unit(query_embedding), answer, expires_at)
+            self._groups.setdefault(group, set()).add(entry_id)
+
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+# Shared by every session in the process (main.py is re-executed on each rerun)
+response_cache = SemanticResponseCache(
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+    maxsize=int(os.getenv("SEMANTIC_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "86400")),
+)
+register_cache("semantic_response", response_cache)
@@ -0,0 +1,124 @@
+import json
+import hashlib
+import threading
+import numpy as np
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from metrics import timed
+from vector_index import load_or_build_index, normalize_rows
+
+# ==========================================================
+# Process-wide retrieval engine shared by the UI and the API
+# ==========================================================
+# Streamlit re-executes main.py on every interaction, but imported modules stay
+# in sys.modules, so the registry below survives reruns and is shared by every
+# session (and by the Flask app) running in the same process.
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def corpus_fingerprint(documents):
+    """
+    Hash of the indexed documents; changes whenever any title or content changes.
+    """
+    payload = json.dumps(
+        [(document.get("title", ""), document.get("content", "")) for document in documents],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RetrievalEngine:
+    """
+    Read-only hybrid index (FAISS vectors + BM25 keywords) over a fixed list of
+    documents (article passages). search() may be called from any number of
+    threads at once: the indexes and the document list are never mutated after
+    construction.
+    """
+
+    def __init__(self, documents, embeddings, embed_query, backend="auto", index_dir=None, index_key=""):
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        if embeddings.ndim != 2 or len(embeddings) != len(documents):
+            raise ValueError("Expected one embedding row per document.")
+
+        self.documents = tuple(documents)
+        self.fingerprint = corpus_fingerprint(self.documents)
+        self.embedding_dim = embeddings.shape[1]
+        self._embed_query = embed_query
+
+        # Cosine similarity: inner product over L2-normalized vectors (see vector_index.py)
+        self.index = load_or_build_index(
+            normalize_rows(embeddings), backend, index_dir, f"{index_key}|{self.fingerprint}"
+        )
+
+        # Keyword index over the same documents (title included)
+        self.lexical_index = BM25Index(
+            [f"{document.get('title', '')}\n{document.get('content', '')}" for document in self.documents]
+        )
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def vector_search(self, query, k):
+        """
+        Return (indices, distances) of the k documents closest to the query embedding,
+        where distance = 1 - cosine similarity. FAISS padding (-1) is dropped.
+        """
+        query_embedding = normalize_rows(self._embed_query(query))  # FAISS requires a 2D array
+
+        with timed("faiss_search"):
+            similarities, indices = self.index.search(query_embedding, min(k, len(self)))
+        keep = indices[0] >= 0
+        return indices[0][keep], 1.0 - similarities[0][keep]
+
+    def search(self, query, k=2):
+        """
+        Return (indices, distances) of the k best documents for the query text,
+        ranked by reciprocal rank fusion of vector and BM25 results.
+        Indices refer to self.documents. Distances are cosine distances from the
+        vector search (inf for keyword-only hits). If the query can't be embedded, the
+        keyword ranking is used on its own.
+        """
+        candidates = max(k * 4, 20)
+
+        vector_ranking, vector_distances = [], {}
+        try:
+            indices, distances = self.vector_search(query, candidates)
+            vector_ranking = [int(i) for i in indices]
+            vector_distances = dict(zip(vector_ranking, distances.tolist()))
+        except Exception as e:
+            print(f"[Retrieval] Vector search unavailable, using keyword search only: {e}")
+
+        with timed("bm25_search"):
+            lexical_ranking = [doc_id for doc_id, _ in self.lexical_index.search(query, candidates)]
+
+        rankings = [ranking for ranking in (vector_ranking, lexical_ranking) if ranking]
+        if len(rankings) > 1:
+            ranked = [doc_id for doc_id, _ in reciprocal_rank_fusion(rankings)]
+        else:
+            ranked = rankings[0] if rankings else []
+
+        top = ranked[:k]
+        return (
+            np.array(top, dtype="int64"),
+            np.array([vector_distances.get(doc_id, np.inf) for doc_id in top], dtype="float32")
+        )
+
+
+def get_retrieval_engine(build_fn, name="default", fingerprint=None):
+    """
+    Return the engine registered under `name`, building it with build_fn() the
+    first time it is requested in this process, or again when the corpus
+    `fingerprint` no longer matches the registered engine.
+    """
+    engine = _engines.get(name)
+    if engine is not None and (fingerprint is None or engine.fingerprint == fingerprint):
+        return engine
+
+    with _engines_lock:
+        engine = _engines.get(name)
+        if engine is None or (fingerprint is not None and engine.fingerprint != fingerprint):
+            engine = build_fn()
+            _engines[name] = engine
+            print("FAISS index created with", len(engine), "passages.")
+        return engine
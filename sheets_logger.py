@@ -0,0 +1,160 @@
+import os
+import atexit
+import threading
+from log_backend import get_interaction_log
+from metrics import timed
+
+# ==================================================
+# Background, batched replication to Google Sheets
+# ==================================================
+# Rows are first stored in the local interaction log (log_backend.py). One
+# daemon thread per process replays unsynced rows from there into the sheet:
+#   - credentials and the worksheet handle are reused until the token expires
+#   - rows are flushed with append_rows when LOG_BATCH_SIZE new rows are waiting
+#     or every LOG_FLUSH_INTERVAL seconds (which also picks up rows left behind
+#     by earlier runs or other workers)
+#   - failed writes are retried with exponential backoff (LOG_MAX_RETRIES); rows
+#     that still fail stay in the local log and are replayed on a later flush
+#   - pending rows are flushed on interpreter shutdown
+
+SPREADSHEET_NAME = "Chatlogs Terrapeak"
+
+
+def authenticate_google_sheets():
+    # Imported here: the Google client libraries are only needed once the
+    # writer thread first syncs, not at app start
+    from google.oauth2.credentials import Credentials
+    from google.auth.transport.requests import Request
+    from gspread.auth import authorize
+
+    creds = Credentials(
+        None,
+        refresh_token=os.getenv("GOOGLE_REFRESH_TOKEN"),
+        token_uri=os.getenv("GOOGLE_TOKEN_URI"),
+        client_id=os.getenv("GOOGLE_CLIENT_ID"),
+        client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
+        scopes=[
+            "https://www.googleapis.com/auth/spreadsheets",
+            "https://www.googleapis.com/auth/drive"
+        ]
+    )
+    creds.refresh(Request())
+    client = authorize(creds)
+    return creds, client
+
+
+class SheetsLogWriter:
+    """
+    Daemon thread that copies unsynced rows from the interaction log to Google Sheets.
+    """
+
+    def __init__(self, store, batch_size=20, flush_interval=5.0, max_retries=5):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._creds = None
+        self._worksheet = None
+        self._new_rows = 0
+        self._closing = False
+        self._wakeup = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sheets-log-writer", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """
+        Tell the writer a new row was stored; flushes early once a batch is full.
+        """
+        with self._wakeup:
+            self._new_rows += 1
+            if self._new_rows >= self.batch_size:
+                self._wakeup.notify()
+
+    def _get_worksheet(self):
+        # Reuse the authorized client until the access token expires
+        if self._worksheet is None or self._creds is None or not self._creds.valid:
+            self._creds, client = authenticate_google_sheets()
+            self._worksheet = client.open(SPREADSHEET_NAME).sheet1
+        return self._worksheet
+
+    def _write(self, rows):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with timed("sheets_logging"):
+                    self._get_worksheet().append_rows(rows, value_input_option="RAW")
+                return True
+            except Exception as e:
+                # Force re-authentication on the next attempt
+                self._worksheet = None
+                if attempt == self.max_retries:
+                    print(f"[Google Sheets Logging Error] Giving up on {len(rows)} rows: {e}")
+                    return False
+                delay = min(60.0, 2 ** attempt)
+                print(f"[Google Sheets Logging Error] {e} (retrying in {delay:.0f}s)")
+                # Returns immediately once close() was called, so shutdown isn't delayed
+                self._stopped.wait(delay)
+
+    def _flush(self):
+        while True:
+            claimed = self.store.claim_pending(self.batch_size)
+            if not claimed:
+                return
+            ids = [row_id for row_id, _ in claimed]
+            if self._write([row for _, row in claimed]):
+                self.store.mark_synced(ids)
+            else:
+                self.store.release(ids)
+                return
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                self._wakeup.wait_for(
+                    lambda: self._closing or self._new_rows >= self.batch_size,
+                    timeout=self.flush_interval
+                )
+                self._new_rows = 0
+                closing = self._closing
+
+            try:
+                self._flush()
+            except Exception as e:
+                print(f"[Google Sheets Logging Error] Failed to read local log: {e}")
+
+            if closing:
+                return
+
+    def close(self, timeout=10.0):
+        """
+        Flush pending rows and stop the writer thread.
+        """
+        self._stopped.set()
+        with self._wakeup:
+            self._closing = True
+            self._wakeup.notify()
+        self._thread.join(timeout)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_sheets_writer():
+    """
+    Return the process-wide writer, starting it (and its shutdown hook) on first use.
+    """
+    global _writer
+    if _writer is not None:
+        return _writer
+
+    with _writer_lock:
+        if _writer is None:
+            _writer = SheetsLogWriter(
+                get_interaction_log(),
+                batch_size=int(os.getenv("LOG_BATCH_SIZE", "20")),
+                flush_interval=float(os.getenv("LOG_FLUSH_INTERVAL", "5")),
+                max_retries=int(os.getenv("LOG_MAX_RETRIES", "5")),
+            )
+            atexit.register(_writer.close)
+        return _writer
@@ -0,0 +1,101 @@
+import threading
+from metrics import inc
+
+# ==========================================================
+# Request coalescing ("single flight")
+# ==========================================================
+# When several threads ask for the same key at the same time, only the first
+# (the leader) calls upstream; the others wait for its result. Errors are
+# raised in every waiter. Nothing is kept once the call finishes; caching the
+# result is up to the caller.
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class Flight:
+    """
+    Handle for one in-flight call. The leader must call resolve() or reject();
+    followers call wait().
+    """
+
+    def __init__(self, group, key, call, leader):
+        self._group = group
+        self._key = key
+        self._call = call
+        self.leader = leader
+
+    def resolve(self, result):
+        self._call.result = result
+        self._group._finish(self._key, self._call)
+
+    def reject(self, error):
+        self._call.error = error
+        self._group._finish(self._key, self._call)
+
+    def wait(self, timeout=None):
+        if not self._call.done.wait(timeout):
+            raise TimeoutError(f"Timed out waiting for in-flight '{self._group.name}' call")
+        if self._call.error is not None:
+            raise self._call.error
+        return self._call.result
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key; `name` labels the metrics.
+    """
+
+    def __init__(self, name, timeout=60):
+        self.name = name
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key):
+        """
+        Join the in-flight call for key, or become its leader (flight.leader).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+        inc("single_flight_calls_total", labels={"group": self.name, "role": "leader" if leader else "follower"},
+            help_text="Calls that went upstream (leader) or shared an in-flight call (follower)")
+        return Flight(self, key, call, leader)
+
+    def _finish(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    def do(self, key, fn):
+        """
+        Return fn(), sharing the result with concurrent callers using the same key.
+        """
+        flight = self.begin(key)
+        if not flight.leader:
+            return flight.wait(self.timeout)
+        try:
+            result = fn()
+        except BaseException as e:
+            # Waiters must never hang, even if the leader is interrupted
+            flight.reject(e if isinstance(e, Exception) else RuntimeError(f"In-flight '{self.name}' call was interrupted"))
+            raise
+        flight.resolve(result)
+        return result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
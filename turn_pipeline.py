@@ -0,0 +1,37 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from metrics import copy_context
+
+# ===========================================================
+# Per-turn pipeline: run intent detection and retrieval together
+# ===========================================================
+# Both steps block on the network (query embedding, and sometimes an intent LLM
+# call), so running them side by side bounds a turn by the slower of the two
+# instead of their sum. The pool is process-wide so Streamlit reruns reuse it.
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TURN_PIPELINE_WORKERS", "16")),
+    thread_name_prefix="turn-pipeline"
+)
+
+
+def classify_and_retrieve(user_query, classify_fn, retrieve_fn):
+    """
+    Start retrieve_fn(user_query) in the background while classify_fn(user_query)
+    runs in the calling thread. Returns (intent, retrieval); retrieval is None
+    for handoffs, whose speculative result is cancelled or discarded.
+    """
+    # Run in a copy of the caller's context so retrieval timings count toward this turn
+    retrieval_future = _executor.submit(copy_context().run, retrieve_fn, user_query)
+
+    try:
+        intent = classify_fn(user_query)
+    except Exception:
+        retrieval_future.cancel()
+        raise
+
+    if intent == "handoff":
+        retrieval_future.cancel()
+        return intent, None
+
+    return intent, retrieval_future.result()
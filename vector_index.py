@@ -0,0 +1,135 @@
+import os
+import hashlib
+import numpy as np
+import faiss
+
+# ==========================================================
+# FAISS index factory (cosine similarity on normalized vectors)
+# ==========================================================
+# Vectors are L2-normalized so inner product == cosine similarity. Backends:
+#   flat   exact IndexFlatIP               small corpora
+#   hnsw   IndexHNSWFlat (graph search)   up to a few hundred thousand vectors
+#   ivfpq  IndexIVFPQ (trained, compressed) very large corpora, bounded memory
+# "auto" picks one from the corpus size. Built indexes are written next to the
+# embedding cache and memory-mapped on the next start.
+
+BACKENDS = ("flat", "hnsw", "ivfpq")
+
+HNSW_MAX_VECTORS = 200_000
+FLAT_MAX_VECTORS = 10_000
+IVFPQ_BITS = 8
+
+
+def normalize_rows(vectors):
+    """
+    Return a float32 copy of vectors with each row scaled to unit length.
+    """
+    vectors = np.array(vectors, dtype="float32", copy=True, ndmin=2)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def choose_backend(count):
+    if count <= FLAT_MAX_VECTORS:
+        return "flat"
+    if count <= HNSW_MAX_VECTORS:
+        return "hnsw"
+    return "ivfpq"
+
+
+def _ivf_lists(count):
+    return max(1, min(int(4 * np.sqrt(count)), count // 39))
+
+
+def ivfpq_trainable(count):
+    # Training needs at least one point per PQ centroid (2**8) and 39 per IVF list
+    return count >= max(2 ** IVFPQ_BITS, 39 * _ivf_lists(count))
+
+
+def _pq_subquantizers(dim):
+    # ~16 dimensions per sub-quantizer; the count must divide the dimension
+    for m in range(max(1, dim // 16), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _configure(index):
+    # Search-time parameters are not always persisted, so set them after load too
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = int(os.getenv("HNSW_EF_SEARCH", "64"))
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = int(os.getenv("IVF_NPROBE", "16"))
+    return index
+
+
+def build_index(vectors, backend):
+    """
+    Build (and train, if needed) an inner-product index over normalized vectors.
+    """
+    count, dim = vectors.shape
+    if backend == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif backend == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 200
+    elif backend == "ivfpq":
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(
+            quantizer, dim, _ivf_lists(count), _pq_subquantizers(dim), IVFPQ_BITS, faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(vectors)
+    else:
+        raise ValueError(f"Unknown vector index backend: {backend}")
+
+    index.add(vectors)
+    return _configure(index)
+
+
+def _read_index(path):
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP)
+    except RuntimeError:
+        # Not every index type supports mmap loading
+        return faiss.read_index(path)
+
+
+def load_or_build_index(vectors, backend="auto", directory=None, cache_key=""):
+    """
+    Return an index for the normalized `vectors`, loading a persisted copy from
+    `directory` when one exists for the same cache_key, backend and shape.
+    """
+    count, dim = vectors.shape
+    if backend == "auto":
+        backend = choose_backend(count)
+    elif backend == "ivfpq" and not ivfpq_trainable(count):
+        print(f"[Vector Index] {count} vectors are too few to train ivfpq; using flat instead")
+        backend = "flat"
+
+    path = None
+    if directory:
+        digest = hashlib.sha256(f"{cache_key}|{backend}|{count}|{dim}".encode("utf-8")).hexdigest()[:16]
+        path = os.path.join(directory, f"index-{backend}-{digest}.faiss")
+        if os.path.exists(path):
+            try:
+                index = _read_index(path)
+                if index.ntotal == count and index.d == dim:
+                    return _configure(index)
+            except RuntimeError as e:
+                print(f"[Vector Index] Rebuilding unreadable index {path}: {e}")
+
+    index = build_index(vectors, backend)
+
+    if path:
+        try:
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            faiss.write_index(index, tmp_path)
+            os.replace(tmp_path, path)
+            for name in os.listdir(directory):
+                if name.startswith("index-") and name.endswith(".faiss") and name != os.path.basename(path):
+                    os.remove(os.path.join(directory, name))
+        except (OSError, RuntimeError) as e:
+            print(f"[Vector Index] Failed to persist index: {e}")
+
+    return index